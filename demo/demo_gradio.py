@@ -235,7 +235,8 @@ def parse_pdf_with_high_level_api(parser, pdf_path, prompt_mode):
             input_path=pdf_path,
             filename=filename,
             prompt_mode=prompt_mode,
-            save_dir=temp_dir
+            save_dir=temp_dir,
+            priority="interactive",  # an upload someone is waiting for, ahead of bulk jobs
         )
         
         # Parse the results
@@ -318,8 +319,7 @@ def process_image_inference(session_state, test_image_input, file_input,
     })
     
     # Update parser configuration
-    dots_parser.ip = server_ip
-    dots_parser.port = server_port
+    dots_parser.set_server(server_ip, server_port)
     dots_parser.min_pixels = min_pixels
     dots_parser.max_pixels = max_pixels
     
@@ -233,8 +233,7 @@ def process_image_inference_with_annotation(annotation_data, test_image_input,
     })
     
     # Update parser configuration
-    dots_parser.ip = server_ip
-    dots_parser.port = server_port
+    dots_parser.set_server(server_ip, server_port)
     dots_parser.min_pixels = min_pixels
     dots_parser.max_pixels = max_pixels
     
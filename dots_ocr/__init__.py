@@ -1 +1,9 @@
-from .parser import DotsOCRParser
\ No newline at end of file
+__all__ = ["DotsOCRParser"]
+
+
+def __getattr__(name):
+    # resolved on first access so that `import dots_ocr.utils...` does not load the parser stack
+    if name == "DotsOCRParser":
+        from .parser import DotsOCRParser
+        return DotsOCRParser
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
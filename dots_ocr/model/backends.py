@@ -0,0 +1,661 @@
+import json
+import time
+import math
+import random
+import asyncio
+import hashlib
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from dots_ocr.model.inference import inference_with_vllm, ainference_with_vllm, client_registry, async_client_registry
+from dots_ocr.model.endpoints import EndpointPool
+from dots_ocr.model.retry import RetryPolicy, LatencyTracker
+from dots_ocr.model.cancellation import ParseCancelled
+from dots_ocr.model.batching import DynamicBatcher
+from dots_ocr.model.hf_registry import hf_model_registry, HF_PROFILES
+from dots_ocr.utils.image_utils import ImageEncodePolicy
+
+
+class InferenceBackend:
+    """
+    Interface of the model backends used by DotsOCRParser.
+
+    `params` holds the sampling parameters of a request: temperature, top_p and
+    max_completion_tokens. `stats` is an optional dict the backend fills with per-request
+    accounting (retries, hedged requests, token usage, finish reason, timings, ...), the
+    parser copies it into the page result. With a `cancel_token` (see CancellationToken) the
+    backend aborts the request and raises ParseCancelled once the token fires.
+    """
+
+    name = "base"
+    # requests the backend can usefully run at once, None for no limit of its own
+    max_concurrency = None
+
+    def infer(self, image, prompt, params, stats=None, cancel_token=None):
+        raise NotImplementedError
+
+    def infer_batch(self, images, prompts, params, stats=None, cancel_token=None):
+        stats = stats or [None] * len(images)
+        return [
+            self.infer(image, prompt, params, s, cancel_token=cancel_token) for image, prompt, s in zip(images, prompts, stats)
+        ]
+
+    def stream(self, image, prompt, params, stats=None):
+        """
+        Yields the response text in chunks, backends without streaming yield it at once.
+        """
+        yield self.infer(image, prompt, params, stats)
+
+    async def ainfer(self, image, prompt, params, stats=None, cancel_token=None):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(self.infer, image, prompt, params, stats, cancel_token=cancel_token))
+
+    def warmup(self):
+        """
+        Pays one-off costs (kernel compilation, allocator growth, ...) before the first real page.
+        """
+        pass
+
+    def close(self):
+        pass
+
+    async def aclose(self):
+        """Releases what the backend holds on the running event loop."""
+        pass
+
+
+class VLLMBackend(InferenceBackend):
+    """
+    OpenAI-compatible HTTP backend for one or several vLLM servers.
+
+    Requests are routed over `endpoints` by least outstanding requests, transient errors
+    are retried with jittered backoff on a freshly picked endpoint and, with `hedge=True`,
+    a request still running after the `hedge_quantile` latency is duplicated to another
+    endpoint and the first success wins.
+    """
+
+    name = "vllm"
+
+    def __init__(
+        self,
+        ip='localhost',
+        port=8000,
+        model_name='model',
+        api_key=None,
+        endpoints=None,
+        endpoint_concurrency=64,
+        retry_policy=None,
+        hedge=False,
+        hedge_quantile=0.95,
+        image_encoding=None,
+    ):
+        self.model_name = model_name
+        self.api_key = api_key
+        self.endpoint_concurrency = endpoint_concurrency
+        self.endpoint_pool = EndpointPool(endpoints or [(ip, port)], max_concurrency=endpoint_concurrency)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.latency_tracker = LatencyTracker()
+        self.image_encoding = image_encoding or ImageEncodePolicy()
+        self._hedge_executor = None
+        # keep-alive pools shared by every parser talking to the same servers, sized to our concurrency
+        self.client_registry = client_registry
+        self._clients = {}
+        for endpoint in self.endpoint_pool.endpoints:
+            self._get_client(endpoint)
+
+    @property
+    def max_concurrency(self):
+        return self.endpoint_pool.max_concurrency
+
+    def set_endpoints(self, endpoints):
+        """Routes the following requests over `endpoints`, requests in flight finish where they are."""
+        endpoint_pool = EndpointPool(endpoints, max_concurrency=self.endpoint_concurrency)
+        for endpoint in endpoint_pool.endpoints:
+            self._get_client(endpoint)
+        self.endpoint_pool = endpoint_pool
+
+    def _get_client(self, endpoint):
+        # retries are driven by the backend so that they can move to another endpoint
+        client = self._clients.get(endpoint.address)
+        if client is None:
+            client = self.client_registry.get(endpoint.ip, endpoint.port, self.api_key, pool_size=endpoint.max_concurrency)
+            client = self._clients[endpoint.address] = client.with_options(max_retries=0)
+        return client
+
+    def _request_kwargs(self, endpoint, params, cancel_token=None):
+        timeout = self.retry_policy.timeout
+        if cancel_token is not None:
+            timeout = cancel_token.bound_timeout(timeout)
+        return dict(
+            model_name=self.model_name,
+            ip=endpoint.ip,
+            port=endpoint.port,
+            temperature=params['temperature'],
+            top_p=params['top_p'],
+            max_completion_tokens=params['max_completion_tokens'],
+            timeout=timeout,
+            image_encoding=self.image_encoding,
+        )
+
+    def infer(self, image, prompt, params, stats=None, cancel_token=None):
+        stats = stats if stats is not None else {}
+        stats.update({'retries': 0, 'hedged': 0})
+        attempt = 0
+        while True:
+            try:
+                return self._hedged_call(image, prompt, params, stats, cancel_token)
+            except Exception as e:
+                if cancel_token is not None:
+                    # a request timed out by the deadline is not retried
+                    cancel_token.raise_if_cancelled()
+                if not self.retry_policy.should_retry(e, attempt):
+                    raise
+                delay = self.retry_policy.backoff(attempt)
+                attempt += 1
+                stats['retries'] = attempt
+                print(f"request error: {e}, retry {attempt}/{self.retry_policy.max_retries} in {delay:.2f}s")
+                if cancel_token is None:
+                    time.sleep(delay)
+                elif cancel_token.wait(delay):
+                    raise ParseCancelled(cancel_token.reason)
+
+    def infer_batch(self, images, prompts, params, stats=None, cancel_token=None):
+        # the server batches on its own, just keep the requests in flight together
+        stats = stats or [None] * len(images)
+        with ThreadPoolExecutor(max_workers=max(1, min(len(images), self.max_concurrency))) as executor:
+            futures = [
+                executor.submit(self.infer, image, prompt, params, s, cancel_token=cancel_token)
+                for image, prompt, s in zip(images, prompts, stats)
+            ]
+            return [future.result() for future in futures]
+
+    def _call(self, image, prompt, params, endpoint, stats=None, cancel_token=None):
+        # runs one request on an acquired endpoint and releases it
+        with self.endpoint_pool.lease(endpoint):
+            start = time.perf_counter()
+            kwargs = self._request_kwargs(endpoint, params, cancel_token)
+            if cancel_token is None:
+                response = inference_with_vllm(
+                    image, prompt, client=self._get_client(endpoint), raise_errors=True, stats=stats, **kwargs
+                )
+            else:
+                try:
+                    response = self._cancellable_call(image, prompt, self._get_client(endpoint), kwargs, stats, cancel_token)
+                except Exception as e:
+                    # e.g. the request timed out at the deadline, not the endpoint's fault
+                    if cancel_token.cancelled:
+                        raise ParseCancelled(cancel_token.reason) from e
+                    raise
+            self.latency_tracker.add(time.perf_counter() - start)
+        return response
+
+    def _cancellable_call(self, image, prompt, client, kwargs, stats, cancel_token):
+        # a blocking request can not be interrupted, a streamed one can be dropped between two chunks;
+        # closing the stream closes the connection, and vLLM aborts requests whose client went away
+        chunks = inference_with_vllm(image, prompt, client=client, stream=True, stats=stats, **kwargs)
+        parts = []
+        try:
+            for chunk in chunks:
+                cancel_token.raise_if_cancelled()
+                parts.append(chunk)
+        finally:
+            chunks.close()
+        cancel_token.raise_if_cancelled()
+        return ''.join(parts)
+
+    def _acquire_hedge_endpoint(self, endpoint):
+        # prefer another server, fall back to the same one when it is the only one with room
+        return self.endpoint_pool.try_acquire(exclude=(endpoint,)) or self.endpoint_pool.try_acquire()
+
+    def _hedged_call(self, image, prompt, params, stats, cancel_token=None):
+        hedge_delay = self.latency_tracker.quantile(self.hedge_quantile) if self.hedge else None
+        endpoint = self.endpoint_pool.acquire()
+        if hedge_delay is None:
+            return self._call(image, prompt, params, endpoint, stats, cancel_token)
+
+        if self._hedge_executor is None:
+            self._hedge_executor = ThreadPoolExecutor(max_workers=2 * self.max_concurrency)
+        # each request accounts into its own dict, only the winner's is kept
+        call_stats = {}
+        primary = self._hedge_executor.submit(self._call, image, prompt, params, endpoint, call_stats, cancel_token)
+        done, _ = wait([primary], timeout=hedge_delay)
+        hedge_endpoint = None if done else self._acquire_hedge_endpoint(endpoint)
+        if hedge_endpoint is None:
+            response = primary.result()
+            stats.update(call_stats)
+            return response
+
+        stats['hedged'] += 1
+        hedge_stats = {}
+        hedge = self._hedge_executor.submit(self._call, image, prompt, params, hedge_endpoint, hedge_stats, cancel_token)
+        pending = {primary, hedge}
+        # the slower request can not be aborted with the blocking client, its response is discarded
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    stats.update(call_stats if future is primary else hedge_stats)
+                    return future.result()
+            if not pending:
+                return future.result()
+
+    def stream(self, image, prompt, params, stats=None):
+        # the endpoint stays acquired until the whole response has been streamed
+        with self.endpoint_pool.endpoint() as endpoint:
+            yield from inference_with_vllm(
+                image,
+                prompt,
+                client=self._get_client(endpoint),
+                stream=True,
+                stats=stats,
+                **self._request_kwargs(endpoint, params),
+            )
+
+    async def ainfer(self, image, prompt, params, stats=None, cancel_token=None):
+        # cancelling the task aborts the request, the token only bounds the timeouts and the retries
+        stats = stats if stats is not None else {}
+        stats.update({'retries': 0, 'hedged': 0})
+        attempt = 0
+        while True:
+            try:
+                return await self._ahedged_call(image, prompt, params, stats, cancel_token)
+            except Exception as e:
+                if cancel_token is not None:
+                    cancel_token.raise_if_cancelled()
+                if not self.retry_policy.should_retry(e, attempt):
+                    raise
+                delay = self.retry_policy.backoff(attempt)
+                attempt += 1
+                stats['retries'] = attempt
+                print(f"request error: {e}, retry {attempt}/{self.retry_policy.max_retries} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    async def _acall(self, image, prompt, params, endpoint, stats=None, cancel_token=None):
+        with self.endpoint_pool.lease(endpoint):
+            client = async_client_registry.get(endpoint.ip, endpoint.port, self.api_key, pool_size=endpoint.max_concurrency)
+            start = time.perf_counter()
+            try:
+                response = await ainference_with_vllm(
+                    image,
+                    prompt,
+                    client=client.with_options(max_retries=0),
+                    raise_errors=True,
+                    stats=stats,
+                    **self._request_kwargs(endpoint, params, cancel_token),
+                )
+            except Exception as e:
+                if cancel_token is not None and cancel_token.cancelled:
+                    raise ParseCancelled(cancel_token.reason) from e
+                raise
+            self.latency_tracker.add(time.perf_counter() - start)
+        return response
+
+    async def _ahedged_call(self, image, prompt, params, stats, cancel_token=None):
+        hedge_delay = self.latency_tracker.quantile(self.hedge_quantile) if self.hedge else None
+        endpoint = await self.endpoint_pool.aacquire()
+        if hedge_delay is None:
+            return await self._acall(image, prompt, params, endpoint, stats, cancel_token)
+
+        call_stats = {}
+        primary = asyncio.ensure_future(self._acall(image, prompt, params, endpoint, call_stats, cancel_token))
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+            hedge_endpoint = None if done else self._acquire_hedge_endpoint(endpoint)
+            if hedge_endpoint is None:
+                response = await primary
+                stats.update(call_stats)
+                return response
+
+            stats['hedged'] += 1
+            hedge_stats = {}
+            tasks.append(asyncio.ensure_future(self._acall(image, prompt, params, hedge_endpoint, hedge_stats, cancel_token)))
+            pending = set(tasks)
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        stats.update(call_stats if task is primary else hedge_stats)
+                        return task.result()
+                if not pending:
+                    return task.result()
+        finally:
+            # abort the losing request, or both when this call itself is cancelled
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def close(self):
+        if self._hedge_executor is not None:
+            self._hedge_executor.shutdown(wait=False)
+
+    async def aclose(self):
+        await async_client_registry.aclose()
+
+
+class HFBackend(InferenceBackend):
+    """
+    In-process transformers backend, one `generate` call per batch.
+
+    Single requests from the parser threads are grouped by a DynamicBatcher: up to
+    `max_batch_size` pages, or whatever arrived within `max_wait_ms` of the first one, go
+    through the processor as one left-padded batch and one `generate` call. The batch decodes
+    up to the largest token budget of its pages and every output is cut back to its own budget.
+    `max_batch_size=1` runs every page on its own.
+
+    The weights come from `hf_model_registry`, so backends of the same `model_path`, `dtype`
+    and `device` share one loaded model; `close` gives the reference back.
+
+    `profile` picks the loading preset of HF_PROFILES: "gpu" (bfloat16, flash attention) or
+    "cpu" (float32 with SDPA attention and int8 dynamic quantization of the linear layers).
+    `dtype`, `device`, `attn_implementation` and `quantization` override single settings of
+    it (`quantization="none"` runs the cpu profile in float32), `num_threads` sets the torch
+    intra-op thread count of the process.
+    """
+
+    name = "hf"
+
+    def __init__(
+        self,
+        model_path="./weights/DotsOCR",
+        max_batch_size=8,
+        max_wait_ms=20,
+        profile="gpu",
+        dtype=None,
+        device=None,
+        attn_implementation=None,
+        quantization=None,
+        num_threads=None,
+    ):
+        from qwen_vl_utils import process_vision_info
+
+        assert profile in HF_PROFILES, f"profile should be one of {list(HF_PROFILES)}, got {profile}"
+        settings = dict(HF_PROFILES[profile])
+        overrides = {'dtype': dtype, 'device': device, 'attn_implementation': attn_implementation, 'quantization': quantization}
+        settings.update({k: v for k, v in overrides.items() if v is not None})
+        if num_threads:
+            import torch
+            torch.set_num_threads(num_threads)
+        self.profile = profile
+        self.handle = hf_model_registry.get(model_path, **settings)
+        self.model = self.handle.model
+        self.processor = self.handle.processor
+        self.process_vision_info = process_vision_info
+        # generate calls of every backend on this model take turns
+        self._lock = self.handle.lock
+        self._chat_texts = {}
+        self.max_batch_size = max_batch_size
+        self.batcher = DynamicBatcher(self._generate, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms) if max_batch_size > 1 else None
+
+    @property
+    def max_concurrency(self):
+        # enough pages in flight to fill the next batch while the current one generates
+        return 2 * self.max_batch_size if self.batcher is not None else 1
+
+    def infer(self, image, prompt, params, stats=None, cancel_token=None):
+        request = (image, prompt, params['max_completion_tokens'], stats, cancel_token)
+        if self.batcher is not None:
+            return self.batcher(request)
+        result, = self._generate([request])
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def infer_batch(self, images, prompts, params, stats=None, cancel_token=None):
+        stats = stats or [None] * len(images)
+        results = self._generate([
+            (image, prompt, params['max_completion_tokens'], s, cancel_token) for image, prompt, s in zip(images, prompts, stats)
+        ])
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
+
+    def warmup(self):
+        """
+        Runs one dummy generate so that the first page does not pay for CUDA context setup,
+        kernel selection and allocator growth. Done once per shared model.
+        """
+        if self.handle.warmed_up:
+            return
+        from PIL import Image
+
+        start = time.perf_counter()
+        image = Image.new("RGB", (224, 224), (255, 255, 255))
+        result, = self._generate([(image, "Extract the text content from this image.", 1, None, None)])
+        if isinstance(result, Exception):
+            raise result
+        self.handle.warmed_up = True
+        print(f"hf model warmed up in {time.perf_counter() - start:.2f}s")
+
+    def close(self):
+        if self.batcher is not None:
+            self.batcher.close()
+        if self.handle is not None:
+            hf_model_registry.release(self.handle)
+            self.handle = self.model = self.processor = None
+
+    def _stopping_criteria(self, cancel_tokens):
+        # checked after every generated token, stops the rows whose job was cancelled
+        import torch
+        from transformers import StoppingCriteria, StoppingCriteriaList
+
+        class _Cancelled(StoppingCriteria):
+            def __call__(self, input_ids, scores, **kwargs):
+                cancelled = [token is not None and token.cancelled for token in cancel_tokens]
+                return torch.tensor(cancelled, dtype=torch.bool, device=input_ids.device)
+
+        return StoppingCriteriaList([_Cancelled()])
+
+    def _chat_text(self, message):
+        """
+        The chat template rendered around a single-image `message`. The template only emits a
+        placeholder for the image, which the processor expands to the page's vision tokens,
+        so the text depends on the prompt alone and is rendered once per prompt. Grounding
+        prompts carry a bbox and are rendered every time once the cache is full.
+        """
+        prompt = message[0]["content"][1]["text"]
+        text = self._chat_texts.get(prompt)
+        if text is None:
+            text = self.processor.apply_chat_template(message, tokenize=False, add_generation_prompt=True)
+            if len(self._chat_texts) < 64:
+                self._chat_texts[prompt] = text
+        return text
+
+    def _generate(self, requests):
+        """
+        Runs a batch of (image, prompt, max_new_tokens, stats, cancel_token) requests, returns the
+        decoded outputs with a ParseCancelled in place of the cancelled ones.
+        """
+        images, prompts, max_new_tokens, stats, cancel_tokens = zip(*requests)
+        messages = [
+            [
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "image",
+                            "image": image
+                        },
+                        {"type": "text", "text": prompt}
+                    ]
+                }
+            ] for image, prompt in zip(images, prompts)
+        ]
+
+        # Preparation for inference
+        start = time.perf_counter()
+        texts = [self._chat_text(message) for message in messages]
+        image_inputs, video_inputs = self.process_vision_info(messages)
+        inputs = self.processor(
+            text=texts,
+            images=image_inputs,
+            videos=video_inputs,
+            padding=True,
+            return_tensors="pt",
+        )
+
+        inputs = inputs.to(self.model.device)
+        encode_time = time.perf_counter() - start
+
+        # Inference: Generation of the output
+        generate_kwargs = {}
+        if any(token is not None for token in cancel_tokens):
+            generate_kwargs['stopping_criteria'] = self._stopping_criteria(cancel_tokens)
+        with self._lock:
+            start = time.perf_counter()
+            generated_ids = self.model.generate(**inputs, max_new_tokens=max(max_new_tokens), **generate_kwargs)
+            generate_time = time.perf_counter() - start
+        generated_ids_trimmed = [
+            out_ids[len(in_ids) :][:limit] for in_ids, out_ids, limit in zip(inputs.input_ids, generated_ids, max_new_tokens)
+        ]
+        outputs = self.processor.batch_decode(
+            generated_ids_trimmed, skip_special_tokens=True, clean_up_tokenization_spaces=False
+        )
+
+        pad_token_id = self.processor.tokenizer.pad_token_id
+        results = []
+        for i, output in enumerate(outputs):
+            if cancel_tokens[i] is not None and cancel_tokens[i].cancelled:
+                results.append(ParseCancelled(cancel_tokens[i].reason))
+                continue
+            if stats[i] is not None:
+                # finished sequences are padded up to the longest one of the batch
+                completion_tokens = int((generated_ids_trimmed[i] != pad_token_id).sum())
+                stats[i].update({
+                    'encode_time': encode_time,
+                    'time_to_response': generate_time,
+                    'prompt_tokens': int(inputs.attention_mask[i].sum()),
+                    'completion_tokens': completion_tokens,
+                    'finish_reason': 'length' if completion_tokens >= max_new_tokens[i] else 'stop',
+                    'batch_size': len(requests),
+                })
+            results.append(output)
+        return results
+
+
+DEFAULT_FAKE_RESPONSE = json.dumps([
+    {"bbox": [112, 84, 1046, 140], "category": "Title", "text": "# Document Title"},
+    {"bbox": [112, 196, 1046, 420], "category": "Text", "text": "Body text of the page."},
+    {"bbox": [112, 448, 1046, 812], "category": "Picture"},
+    {"bbox": [560, 1560, 600, 1590], "category": "Page-footer", "text": "1"},
+])
+
+
+def load_recorded_responses(path):
+    """
+    Reads recorded model responses from a .jsonl file, one per line, either as a JSON
+    string or as an object with a "response" field.
+    """
+    responses = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            responses.append(record['response'] if isinstance(record, dict) else record)
+    assert len(responses) > 0, f"no responses recorded in {path}"
+    return responses
+
+
+class FakeBackend(InferenceBackend):
+    """
+    Deterministic stand-in for a model that replays recorded responses, for measuring the
+    parsing pipeline on CPU-only machines.
+
+    The response and the latency of a request are derived from a hash of its input, so the
+    same page always gets the same answer after the same delay whatever the thread scheduling.
+
+    Args:
+        responses: Recorded responses, a list of strings or the path of a .jsonl file (see
+            `load_recorded_responses`). Defaults to a small canned layout.
+        latency: Mean latency in seconds.
+        distribution: 'constant', 'uniform' (0 to 2x mean), 'exponential' or 'lognormal'.
+        sigma: Shape of the lognormal distribution.
+        seed: Seed mixed into the per-request hash.
+        max_concurrency: Simulated number of requests the model serves at once, None for no limit.
+    """
+
+    name = "fake"
+
+    def __init__(self, responses=None, latency=0.0, distribution='constant', sigma=0.5, seed=0, max_concurrency=None):
+        if isinstance(responses, str):
+            responses = load_recorded_responses(responses)
+        self.responses = responses or [DEFAULT_FAKE_RESPONSE]
+        assert distribution in ('constant', 'uniform', 'exponential', 'lognormal'), f"unknown latency distribution {distribution}"
+        self.latency = latency
+        self.distribution = distribution
+        self.sigma = sigma
+        self.seed = seed
+        self.max_concurrency = max_concurrency
+        self._slots = threading.Semaphore(max_concurrency) if max_concurrency else None
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _request_hash(self, image, prompt):
+        # a thumbnail is enough to tell pages apart and keeps hashing cheap
+        h = hashlib.sha1(image.resize((16, 16)).tobytes())
+        h.update(f"{image.size}{prompt}{self.seed}".encode('utf-8'))
+        return int(h.hexdigest(), 16)
+
+    def sample_latency(self, rng):
+        if self.latency <= 0 or self.distribution == 'constant':
+            return max(0.0, self.latency)
+        if self.distribution == 'uniform':
+            return rng.uniform(0, 2 * self.latency)
+        if self.distribution == 'exponential':
+            return rng.expovariate(1 / self.latency)
+        # mean-preserving lognormal
+        return self.latency * math.exp(rng.gauss(0, self.sigma) - self.sigma ** 2 / 2)
+
+    def _plan(self, image, prompt, params, stats):
+        with self._lock:
+            self.calls += 1
+        key = self._request_hash(image, prompt)
+        response, latency = self.responses[key % len(self.responses)], self.sample_latency(random.Random(key))
+        if stats is not None:
+            # no tokenizer here, approximate the usage from the text lengths
+            completion_tokens = len(response) // 3
+            stats.update({
+                'encode_time': 0.0,
+                'time_to_response': latency,
+                'prompt_tokens': len(prompt) // 3,
+                'completion_tokens': completion_tokens,
+                'finish_reason': 'length' if completion_tokens >= params['max_completion_tokens'] else 'stop',
+            })
+        return response, latency
+
+    def _sleep(self, latency, cancel_token):
+        if cancel_token is None:
+            time.sleep(latency)
+        elif cancel_token.wait(latency):
+            raise ParseCancelled(cancel_token.reason)
+
+    def infer(self, image, prompt, params, stats=None, cancel_token=None):
+        response, latency = self._plan(image, prompt, params, stats)
+        if self._slots is None:
+            self._sleep(latency, cancel_token)
+        else:
+            with self._slots:
+                self._sleep(latency, cancel_token)
+        return response
+
+    def stream(self, image, prompt, params, stats=None, chunk_size=16):
+        response, latency = self._plan(image, prompt, params, stats)
+        num_chunks = max(1, math.ceil(len(response) / chunk_size))
+        for i in range(num_chunks):
+            time.sleep(latency / num_chunks)
+            yield response[i * chunk_size:(i + 1) * chunk_size]
+
+    async def ainfer(self, image, prompt, params, stats=None, cancel_token=None):
+        response, latency = self._plan(image, prompt, params, stats)
+        if cancel_token is None:
+            await asyncio.sleep(latency)
+        else:
+            # an explicit cancel() reaches the task through the parser, only the deadline is checked here
+            await asyncio.sleep(cancel_token.bound_timeout(latency))
+            cancel_token.raise_if_cancelled()
+        return response
@@ -0,0 +1,105 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+_CLOSE = object()
+
+
+class DynamicBatcher:
+    """
+    Groups single requests from many threads into batches for one batched call.
+
+    A worker thread takes the first waiting request, then keeps collecting until it holds
+    `max_batch_size` requests or `max_wait_ms` milliseconds went by, and calls
+    `run_batch(items)`. That returns one result per item, an Exception instance in place of
+    a result fails only that item; if `run_batch` raises, every item of the batch fails.
+
+    Args:
+        run_batch: Callable taking a list of items and returning a list of results.
+        max_batch_size: Largest number of items per batch.
+        max_wait_ms: How long a batch waits for more items after its first one.
+    """
+
+    def __init__(self, run_batch, max_batch_size=8, max_wait_ms=20):
+        assert max_batch_size >= 1
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.batches = 0
+        self.items = 0
+        self._queue = queue.Queue()
+        self._worker = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="dynamic-batcher", daemon=True)
+                self._worker.start()
+
+    def submit(self, item):
+        """
+        Queues `item` and returns a concurrent.futures.Future of its result.
+        """
+        assert not self._closed, "batcher is closed"
+        future = Future()
+        self._queue.put((item, future))
+        self._ensure_worker()
+        return future
+
+    def __call__(self, item):
+        return self.submit(item).result()
+
+    def close(self):
+        """
+        Stops the worker once the requests queued so far are done.
+        """
+        with self._lock:
+            self._closed = True
+            if self._worker is not None:
+                self._queue.put(_CLOSE)
+
+    def _collect(self):
+        """
+        Returns the next batch and whether close() was called.
+        """
+        entry = self._queue.get()
+        if entry is _CLOSE:
+            return [], True
+        batch = [entry]
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is _CLOSE:
+                return batch, True
+            batch.append(entry)
+        return batch, False
+
+    def _run(self):
+        closing = False
+        while not closing:
+            batch, closing = self._collect()
+            # callers may have given up on their future in the meantime
+            batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            try:
+                results = self.run_batch([item for item, _ in batch])
+                assert len(results) == len(batch), f"run_batch returned {len(results)} results for {len(batch)} items"
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
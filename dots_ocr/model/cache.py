@@ -0,0 +1,108 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+
+
+def make_cache_key(image, prompt, **params):
+    """
+    Content address of a model call: the exact pixels sent to the model (after resizing),
+    the prompt, and the model name / sampling parameters given as keyword arguments.
+    """
+    h = hashlib.sha256()
+    h.update(f"{image.mode}:{image.width}x{image.height}\n".encode("utf-8"))
+    h.update(image.tobytes())
+    h.update(prompt.encode("utf-8"))
+    h.update(json.dumps(params, sort_keys=True, default=str).encode("utf-8"))
+    return h.hexdigest()
+
+
+class ResponseCache:
+    """
+    On-disk cache of model responses, safe to share between threads and processes.
+
+    Entries are written to a temporary file and moved into place with `os.replace`, so readers
+    never see a partial entry. Reads refresh the file mtime, and once the cache grows past
+    `max_bytes` the least recently used entries are evicted down to `evict_ratio` of it.
+    """
+
+    def __init__(self, cache_dir, max_bytes=1 << 30, evict_ratio=0.9):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = max_bytes
+        self.evict_ratio = evict_ratio
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._size = sum(size for _, size, _ in self._entries())
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:  # evicted by another process
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def get(self, key):
+        """
+        Returns the cached response for `key`, or None on a miss.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                response = json.load(f)["response"]
+            os.utime(path)  # mark as recently used
+        except (FileNotFoundError, ValueError, KeyError):
+            response = None
+        with self._lock:
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return response
+
+    def put(self, key, response):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"response": response}, f, ensure_ascii=False)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with self._lock:
+            self._size += size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # rescan, other processes write to the same directory
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * self.evict_ratio
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._size = total
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "bytes": self._size}
@@ -0,0 +1,101 @@
+import time
+import threading
+
+
+OK = 'ok'
+CANCELLED = 'cancelled'
+DEADLINE_EXCEEDED = 'deadline_exceeded'
+
+
+class ParseCancelled(Exception):
+    """
+    Raised inside a parse job once its CancellationToken fired, `reason` is the token's reason.
+    """
+
+    def __init__(self, reason=CANCELLED):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class CancellationToken:
+    """
+    Cooperative cancellation of a parse job, shared by the threads or tasks working on it.
+
+    The token fires when `cancel()` is called, when the wall-clock `deadline` (a `time.time()`
+    timestamp) passes, or when its `parent` token fires. Work that has not started checks
+    `cancelled` and is skipped, in-flight requests are aborted by the backends.
+    """
+
+    def __init__(self, deadline=None, parent=None):
+        if parent is not None and parent.deadline is not None:
+            deadline = parent.deadline if deadline is None else min(deadline, parent.deadline)
+        self.deadline = deadline
+        self.reason = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+        if parent is not None:
+            parent.add_callback(lambda: self.cancel(parent.reason))
+
+    @classmethod
+    def with_timeout(cls, seconds, parent=None):
+        return cls(deadline=time.time() + seconds, parent=parent)
+
+    def cancel(self, reason=CANCELLED):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    @property
+    def cancelled(self):
+        if not self._event.is_set() and self.deadline is not None and time.time() >= self.deadline:
+            self.cancel(DEADLINE_EXCEEDED)
+        return self._event.is_set()
+
+    def remaining(self):
+        """
+        Seconds left before the deadline, None without one.
+        """
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.time())
+
+    def bound_timeout(self, timeout=None):
+        """
+        `timeout` shortened to the time left before the deadline.
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return timeout
+        return remaining if timeout is None else min(timeout, remaining)
+
+    def wait(self, timeout=None):
+        """
+        Sleeps up to `timeout` seconds, waking up early on cancellation. Returns `cancelled`.
+        """
+        self._event.wait(self.bound_timeout(timeout))
+        return self.cancelled
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise ParseCancelled(self.reason)
+
+    def add_callback(self, callback):
+        """
+        Calls `callback()` on cancellation, right away if the token already fired.
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
@@ -0,0 +1,153 @@
+import time
+import asyncio
+import threading
+from contextlib import contextmanager, asynccontextmanager
+
+from dots_ocr.model.cancellation import ParseCancelled
+from dots_ocr.model.retry import retryable_errors
+
+
+def parse_endpoints(endpoints):
+    """
+    Normalizes endpoints given as "host:port" strings, a comma separated string of those,
+    or (host, port) tuples into a list of (host, port) tuples.
+    """
+    if isinstance(endpoints, str):
+        endpoints = [e for e in endpoints.split(',') if e.strip()]
+    parsed = []
+    for endpoint in endpoints:
+        if isinstance(endpoint, str):
+            host, _, port = endpoint.strip().rpartition(':')
+            assert host and port.isdigit(), f"endpoint should be host:port, got {endpoint}"
+            endpoint = (host, int(port))
+        parsed.append((endpoint[0], int(endpoint[1])))
+    assert len(parsed) > 0, "at least one endpoint is required"
+    return parsed
+
+
+class Endpoint:
+    def __init__(self, ip, port, max_concurrency):
+        self.ip = ip
+        self.port = port
+        self.max_concurrency = max_concurrency
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+
+    @property
+    def address(self):
+        return f"{self.ip}:{self.port}"
+
+    def __repr__(self):
+        return f"Endpoint({self.address}, outstanding={self.outstanding}, failures={self.consecutive_failures})"
+
+
+class EndpointPool:
+    """
+    Routes requests across several vLLM servers by least outstanding requests.
+
+    Each endpoint admits at most `max_concurrency` requests at a time. An endpoint whose
+    request fails to connect, times out or gets a 5xx/429 is ejected for `eject_seconds`,
+    doubling with every consecutive failure up to `max_eject_seconds`. Once that expires it
+    is re-admitted and the first success clears its failure count. When every endpoint is ejected, requests
+    go to the one due back first rather than failing outright.
+    """
+
+    def __init__(self, endpoints, max_concurrency=64, eject_seconds=10.0, max_eject_seconds=300.0):
+        self.endpoints = [Endpoint(ip, port, max_concurrency) for ip, port in parse_endpoints(endpoints)]
+        self.eject_seconds = eject_seconds
+        self.max_eject_seconds = max_eject_seconds
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return len(self.endpoints)
+
+    @property
+    def max_concurrency(self):
+        return sum(endpoint.max_concurrency for endpoint in self.endpoints)
+
+    def _select(self, now, exclude=()):
+        endpoints = [e for e in self.endpoints if e not in exclude]
+        candidates = [e for e in endpoints if e.outstanding < e.max_concurrency]
+        if not candidates:
+            return None
+        admitted = [e for e in candidates if e.ejected_until <= now]
+        if admitted:
+            return min(admitted, key=lambda e: e.outstanding / e.max_concurrency)
+        if any(e.ejected_until <= now for e in endpoints):
+            return None  # a healthy endpoint is only busy, wait for it
+        return min(candidates, key=lambda e: e.ejected_until)
+
+    def try_acquire(self, exclude=()):
+        with self._cond:
+            endpoint = self._select(time.monotonic(), exclude=exclude)
+            if endpoint is not None:
+                endpoint.outstanding += 1
+            return endpoint
+
+    def acquire(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                endpoint = self._select(time.monotonic())
+                if endpoint is not None:
+                    endpoint.outstanding += 1
+                    return endpoint
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("no vllm endpoint available")
+                # ejections expire without a notify, so wake up periodically
+                self._cond.wait(0.1 if remaining is None else min(remaining, 0.1))
+
+    async def aacquire(self, poll_interval=0.01):
+        while True:
+            endpoint = self.try_acquire()
+            if endpoint is not None:
+                return endpoint
+            await asyncio.sleep(poll_interval)
+
+    def release(self, endpoint, success=True):
+        """
+        Returns a slot of `endpoint`. `success=None` leaves its health untouched, which is
+        what a cancelled request should do.
+        """
+        with self._cond:
+            endpoint.outstanding -= 1
+            if success:
+                endpoint.consecutive_failures = 0
+                endpoint.ejected_until = 0.0
+            elif success is not None:
+                endpoint.consecutive_failures += 1
+                eject = min(self.eject_seconds * 2 ** (endpoint.consecutive_failures - 1), self.max_eject_seconds)
+                endpoint.ejected_until = time.monotonic() + eject
+                print(f"endpoint {endpoint.address} ejected for {eject:.1f}s after {endpoint.consecutive_failures} failure(s)")
+            self._cond.notify_all()
+
+    @contextmanager
+    def lease(self, endpoint):
+        """
+        Releases an already acquired `endpoint` on exit, marking it failed if the body raised
+        one of the retryable errors. A cancelled request or a client error (e.g. a 400 for a
+        page over the context length) says nothing about the endpoint's health.
+        """
+        success = None
+        try:
+            yield endpoint
+            success = True
+        except ParseCancelled:
+            raise
+        except Exception as e:
+            success = False if isinstance(e, retryable_errors()) else None
+            raise
+        finally:
+            self.release(endpoint, success=success)
+
+    @contextmanager
+    def endpoint(self, timeout=None):
+        with self.lease(self.acquire(timeout=timeout)) as endpoint:
+            yield endpoint
+
+    @asynccontextmanager
+    async def aendpoint(self):
+        with self.lease(await self.aacquire()) as endpoint:
+            yield endpoint
@@ -0,0 +1,147 @@
+import os
+import gc
+import threading
+
+
+# loading presets of HFBackend, explicit dtype/device/... arguments override them.
+# "cpu" runs without a GPU: SDPA attention and the linear layers dynamically quantized to int8,
+# which needs float32 weights to start from. quantization="none" turns it off explicitly,
+# None leaves the profile's choice.
+HF_PROFILES = {
+    "gpu": {"dtype": "bfloat16", "device": "auto", "attn_implementation": "flash_attention_2", "quantization": None},
+    "cpu": {"dtype": "float32", "device": "cpu", "attn_implementation": "sdpa", "quantization": "int8"},
+}
+
+
+class HFModelHandle:
+    """
+    A loaded model and processor shared by every HFBackend that asked for the same weights.
+
+    `lock` serialises `generate` calls on the model across those backends, `warmed_up` is
+    set once one of them ran the dummy generate of HFBackend.warmup.
+    """
+
+    def __init__(self, key, model, processor):
+        self.key = key
+        self.model = model
+        self.processor = processor
+        self.lock = threading.Lock()
+        self.warmed_up = False
+        self.refcount = 0
+
+    @property
+    def device(self):
+        return self.model.device
+
+    def __repr__(self):
+        model_path, dtype, device, _, quantization = self.key
+        return f"HFModelHandle({model_path}, dtype={dtype}, device={device}, quantization={quantization}, refs={self.refcount})"
+
+
+class HFModelRegistry:
+    """
+    Process-wide, thread-safe cache of transformers models keyed by (path, dtype, device,
+    attention implementation, quantization).
+
+    Parsers built with `use_hf=True` share one copy of the weights instead of each loading
+    its own. Weights are read from safetensors, which memory-maps the files rather than
+    copying them through a state dict, with `low_cpu_mem_usage` so no random initialisation
+    is materialised first. Two threads asking for the same model wait for a single load.
+    `release` drops the model once no backend references it any more.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._handles = {}
+        self._load_locks = {}
+
+    @staticmethod
+    def make_key(model_path, dtype="bfloat16", device="auto", attn_implementation="flash_attention_2", quantization=None):
+        # the same directory reached through different relative paths is the same model
+        if os.path.exists(model_path):
+            model_path = os.path.realpath(model_path)
+        if quantization == "none":
+            quantization = None
+        assert quantization in (None, "int8"), f"unsupported quantization {quantization}"
+        if quantization == "int8":
+            assert str(device) == "cpu" and str(dtype) == "float32", "dynamic int8 quantization needs float32 weights on cpu"
+        return (model_path, str(dtype), str(device), attn_implementation, quantization)
+
+    def _load(self, key):
+        import torch
+        from transformers import AutoModelForCausalLM, AutoProcessor
+
+        model_path, dtype, device, attn_implementation, quantization = key
+        print(f"loading hf model from {model_path} ({dtype}, {device}, {attn_implementation}, quantization={quantization})")
+        model = AutoModelForCausalLM.from_pretrained(
+            model_path,
+            attn_implementation=attn_implementation,
+            torch_dtype=getattr(torch, dtype),
+            device_map=device,
+            trust_remote_code=True,
+            use_safetensors=True,
+            low_cpu_mem_usage=True,
+        )
+        model.eval()
+        if quantization == "int8":
+            # weights of every nn.Linear stored as int8, activations quantized on the fly per batch
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        processor = AutoProcessor.from_pretrained(model_path, trust_remote_code=True, use_fast=True)
+        processor.tokenizer.padding_side = "left"  # batched generation appends after the prompt
+        return HFModelHandle(key, model, processor)
+
+    def get(self, model_path, dtype="bfloat16", device="auto", attn_implementation="flash_attention_2", quantization=None):
+        """
+        Returns the shared handle of the model, loading it on first use. Every `get` should
+        be paired with a `release`.
+        """
+        key = self.make_key(
+            model_path, dtype=dtype, device=device, attn_implementation=attn_implementation, quantization=quantization,
+        )
+        with self._lock:
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+        # loads of different models may run side by side, loads of the same one happen once
+        with load_lock:
+            with self._lock:
+                handle = self._handles.get(key)
+            if handle is None:
+                handle = self._load(key)
+            with self._lock:
+                handle = self._handles.setdefault(key, handle)
+                handle.refcount += 1
+        return handle
+
+    def release(self, handle):
+        with self._lock:
+            handle.refcount -= 1
+            if handle.refcount > 0 or self._handles.get(handle.key) is not handle:
+                return
+            del self._handles[handle.key]
+        self._free(handle)
+
+    def clear(self):
+        """
+        Drops every cached model, whether or not backends still hold it.
+        """
+        with self._lock:
+            handles = list(self._handles.values())
+            self._handles.clear()
+        for handle in handles:
+            self._free(handle)
+
+    def _free(self, handle):
+        handle.model = None
+        handle.processor = None
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+
+    def __len__(self):
+        return len(self._handles)
+
+
+hf_model_registry = HFModelRegistry()
@@ -2,49 +2,259 @@ import json
 import io
 import base64
 import math
+import time
+import asyncio
+import threading
 from PIL import Image
-import requests
 from dots_ocr.utils.image_utils import PILimage_to_base64
-from openai import OpenAI
 import os
 
 
-def inference_with_vllm(
-        image,
-        prompt, 
-        ip="localhost",
-        port=8000,
-        temperature=0.1,
-        top_p=0.9,
-        max_completion_tokens=32768,
-        model_name='model',
-        ):
-    
-    addr = f"http://{ip}:{port}/v1"
-    client = OpenAI(api_key="{}".format(os.environ.get("API_KEY", "0")), base_url=addr)
-    messages = []
-    messages.append(
+def _request_errors():
+    # imported on first request rather than with the module, openai alone takes ~0.5s
+    import requests
+    import openai
+    return (requests.exceptions.RequestException, openai.OpenAIError)
+
+
+class _ClientSet:
+    # clients of one scope (the process, or one event loop) and the ones replaced by bigger pools,
+    # which backends may still be using and are only closed with the set
+    def __init__(self):
+        self.clients = {}
+        self.retired = []
+
+    def all_clients(self):
+        return [client for client, _ in self.clients.values()] + self.retired
+
+
+class OpenAIClientRegistry:
+    """
+    Process-wide, thread-safe cache of OpenAI clients keyed by (ip, port, api_key).
+
+    Each client wraps a single httpx connection pool with keep-alive, so the
+    threads of a parser reuse TCP connections to the vLLM server instead of
+    opening a new one per page. With `is_async=True` the registry hands out
+    AsyncOpenAI clients instead; those are bound to the running event loop,
+    so they are cached per loop. `aclose` closes those of the running loop; the
+    clients of a loop closed without it are dropped on the next `get`.
+
+    A caller asking for a bigger pool than the cached client's gets a new client; the
+    old one stays open for the backends holding it until `close`.
+    """
+
+    def __init__(self, is_async=False):
+        self.is_async = is_async
+        self._lock = threading.Lock()
+        self._clients = _ClientSet()
+        # the clients reference their loop, a weak mapping would never let go of it
+        self._loop_clients = {}
+
+    def _new_client(self, ip, port, api_key, pool_size):
+        import httpx
+        from openai import OpenAI, AsyncOpenAI
+        limits = httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+        )
+        base_url = f"http://{ip}:{port}/v1"
+        if self.is_async:
+            return AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=httpx.AsyncClient(limits=limits))
+        return OpenAI(api_key=api_key, base_url=base_url, http_client=httpx.Client(limits=limits))
+
+    def get(self, ip="localhost", port=8000, api_key=None, pool_size=64):
+        api_key = api_key if api_key is not None else os.environ.get("API_KEY", "0")
+        key = (ip, int(port), api_key)
+        with self._lock:
+            if self.is_async:
+                for loop in [loop for loop in self._loop_clients if loop.is_closed()]:
+                    # too late to close them on their loop, dropping them lets their sockets be collected
+                    del self._loop_clients[loop]
+                client_set = self._loop_clients.setdefault(asyncio.get_running_loop(), _ClientSet())
+            else:
+                client_set = self._clients
+            entry = client_set.clients.get(key)
+            # grow the pool when a caller needs more connections than the cached client holds
+            if entry is None or entry[1] < pool_size:
+                if entry is not None:
+                    client_set.retired.append(entry[0])
+                entry = (self._new_client(ip, port, api_key, pool_size), pool_size)
+                client_set.clients[key] = entry
+            return entry[0]
+
+    def close(self):
+        with self._lock:
+            client_set, self._clients = self._clients, _ClientSet()
+        for client in client_set.all_clients():
+            client.close()
+
+    async def aclose(self):
+        """
+        Closes the async clients of the running loop, once no request on it is in flight any
+        more; the next `get` on the loop opens new ones.
+        """
+        with self._lock:
+            client_set = self._loop_clients.pop(asyncio.get_running_loop(), None)
+        for client in client_set.all_clients() if client_set is not None else []:
+            await client.close()
+
+
+client_registry = OpenAIClientRegistry()
+async_client_registry = OpenAIClientRegistry(is_async=True)
+
+
+def build_vllm_messages(image_url, prompt):
+    return [
         {
             "role": "user",
             "content": [
                 {
                     "type": "image_url",
-                    "image_url": {"url":  PILimage_to_base64(image)},
+                    "image_url": {"url":  image_url},
                 },
                 {"type": "text", "text": f"<|img|><|imgpad|><|endofimg|>{prompt}"}  # if no "<|img|><|imgpad|><|endofimg|>" here,vllm v1 will add "\n" here
             ],
         }
-    )
+    ]
+
+
+def record_usage(stats, usage=None, finish_reason=None):
+    """
+    Copies the token usage and the finish reason of a chat completion into `stats`.
+    """
+    if stats is None:
+        return
+    if usage is not None:
+        stats['prompt_tokens'] = usage.prompt_tokens
+        stats['completion_tokens'] = usage.completion_tokens
+    if finish_reason is not None:
+        stats['finish_reason'] = finish_reason
+
+
+def inference_with_vllm(
+        image,
+        prompt,
+        ip="localhost",
+        port=8000,
+        temperature=0.1,
+        top_p=0.9,
+        max_completion_tokens=32768,
+        model_name='model',
+        client=None,
+        stream=False,
+        timeout=None,
+        raise_errors=False,
+        image_encoding=None,
+        stats=None,
+        ):
+    """
+    Sends one page to a vLLM server. When a `stats` dict is given it receives the client-side
+    `encode_time`, the `time_to_response` (time to the first token when streaming), and the
+    `prompt_tokens`, `completion_tokens` and `finish_reason` reported by the server.
+    """
+    if client is None:
+        client = client_registry.get(ip, port)
+    encode = image_encoding.encode if image_encoding is not None else PILimage_to_base64
+    start = time.perf_counter()
+    messages = build_vllm_messages(encode(image), prompt)
+    if stats is not None:
+        stats['encode_time'] = time.perf_counter() - start
+    if stream:
+        return _iter_stream_content(
+            client,
+            stats=stats,
+            messages=messages,
+            model=model_name,
+            max_completion_tokens=max_completion_tokens,
+            temperature=temperature,
+            top_p=top_p,
+            timeout=timeout,
+            stream_options={"include_usage": True},
+        )
     try:
+        start = time.perf_counter()
         response = client.chat.completions.create(
-            messages=messages, 
-            model=model_name, 
+            messages=messages,
+            model=model_name,
             max_completion_tokens=max_completion_tokens,
             temperature=temperature,
-            top_p=top_p)
+            top_p=top_p,
+            timeout=timeout)
+        if stats is not None:
+            stats['time_to_response'] = time.perf_counter() - start
+        record_usage(stats, response.usage, response.choices[0].finish_reason)
         response = response.choices[0].message.content
         return response
-    except requests.exceptions.RequestException as e:
+    except _request_errors() as e:
+        if raise_errors:
+            raise
         print(f"request error: {e}")
         return None
 
+
+def _iter_stream_content(client, stats=None, **kwargs):
+    # yields the text deltas of a streamed chat completion as they arrive
+    start = time.perf_counter()
+    response = client.chat.completions.create(stream=True, **kwargs)
+    with response:
+        for chunk in response:
+            # the usage comes in a last chunk without choices
+            record_usage(stats, chunk.usage)
+            if not chunk.choices:
+                continue
+            record_usage(stats, finish_reason=chunk.choices[0].finish_reason)
+            content = chunk.choices[0].delta.content
+            if content:
+                if stats is not None and 'time_to_response' not in stats:
+                    stats['time_to_response'] = time.perf_counter() - start
+                yield content
+
+
+async def ainference_with_vllm(
+        image,
+        prompt,
+        ip="localhost",
+        port=8000,
+        temperature=0.1,
+        top_p=0.9,
+        max_completion_tokens=32768,
+        model_name='model',
+        client=None,
+        executor=None,
+        timeout=None,
+        raise_errors=False,
+        image_encoding=None,
+        stats=None,
+        ):
+    """
+    Asyncio counterpart of `inference_with_vllm`. The base64 encoding of the
+    image is CPU-bound, so it runs in `executor` (the loop default if None).
+    """
+    if client is None:
+        client = async_client_registry.get(ip, port)
+    encode = image_encoding.encode if image_encoding is not None else PILimage_to_base64
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    image_url = await loop.run_in_executor(executor, encode, image)
+    if stats is not None:
+        stats['encode_time'] = time.perf_counter() - start
+    messages = build_vllm_messages(image_url, prompt)
+    try:
+        start = time.perf_counter()
+        response = await client.chat.completions.create(
+            messages=messages,
+            model=model_name,
+            max_completion_tokens=max_completion_tokens,
+            temperature=temperature,
+            top_p=top_p,
+            timeout=timeout)
+        if stats is not None:
+            stats['time_to_response'] = time.perf_counter() - start
+        record_usage(stats, response.usage, response.choices[0].finish_reason)
+        response = response.choices[0].message.content
+        return response
+    except _request_errors() as e:
+        if raise_errors:
+            raise
+        print(f"request error: {e}")
+        return None
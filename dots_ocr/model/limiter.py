@@ -0,0 +1,168 @@
+import time
+import math
+import asyncio
+import threading
+from contextlib import contextmanager, asynccontextmanager
+
+from dots_ocr.model.cancellation import ParseCancelled
+
+
+class AIMDLimiter:
+    """
+    Adaptive limit on in-flight model requests (additive increase, multiplicative decrease).
+
+    OCR latency mostly follows the length of the output, so a request is only compared with
+    requests of about the same size: completion token counts are grouped in
+    `buckets_per_octave` buckets per doubling and each bucket keeps a baseline, the lowest
+    latency seen in it, creeping towards newer samples by `baseline_drift` so that it
+    follows a genuinely slower server without forgetting what an unloaded one looks like.
+    Requests without a token count share one bucket.
+
+    The limit grows by about one request per round trip while the smoothed ratio of latency
+    to its bucket's baseline stays within `latency_tolerance`, so on an idle server it climbs
+    to `max_limit` whatever the mix of blank and dense pages. It is multiplied by `backoff`
+    when the ratio climbs past that or a request fails, at most once per round trip so that
+    one burst of slow responses counts as one congestion signal.
+
+    Args:
+        initial_limit: Starting number of in-flight requests.
+        min_limit: Lower bound of the limit.
+        max_limit: Upper bound of the limit, e.g. the number of worker threads.
+        backoff: Multiplicative decrease factor.
+        latency_tolerance: Ratio of latency to baseline latency treated as queueing.
+        smoothing: Weight of a new sample in the exponential moving averages.
+        baseline_drift: Fraction of the gap to a new sample a bucket's baseline moves up by.
+        buckets_per_octave: Completion token buckets per doubling of the token count.
+    """
+
+    def __init__(
+        self,
+        initial_limit=8,
+        min_limit=1,
+        max_limit=64,
+        backoff=0.7,
+        latency_tolerance=2.0,
+        smoothing=0.2,
+        baseline_drift=0.001,
+        buckets_per_octave=4,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.smoothing = smoothing
+        self.baseline_drift = baseline_drift
+        self.buckets_per_octave = buckets_per_octave
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self._in_flight = 0
+        self._latency = None
+        self._ratio = None
+        self._baselines = {}
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def acquire(self):
+        with self._cond:
+            while self._in_flight >= int(self._limit):
+                self._cond.wait()
+            self._in_flight += 1
+
+    def try_acquire(self):
+        with self._cond:
+            if self._in_flight >= int(self._limit):
+                return False
+            self._in_flight += 1
+            return True
+
+    async def aacquire(self, poll_interval=0.01):
+        while not self.try_acquire():
+            await asyncio.sleep(poll_interval)
+
+    def _bucket(self, completion_tokens):
+        if completion_tokens is None:
+            return None
+        return int(self.buckets_per_octave * math.log2(completion_tokens + 1))
+
+    def release(self, latency=None, error=False, completion_tokens=None):
+        """
+        Returns a slot and feeds the outcome of the request to the controller. `latency=None`
+        without an error (e.g. a cancelled request) leaves the limit unchanged.
+        `completion_tokens` picks the baseline the latency is compared with.
+        """
+        with self._cond:
+            self._in_flight -= 1
+            if error:
+                self._decrease()
+            elif latency is not None:
+                # the round trip time, spaces out the decreases
+                self._latency = latency if self._latency is None else (
+                    self.smoothing * latency + (1 - self.smoothing) * self._latency
+                )
+                bucket = self._bucket(completion_tokens)
+                baseline = self._baselines.get(bucket)
+                if baseline is None or latency < baseline:
+                    baseline = latency
+                else:
+                    baseline += (latency - baseline) * self.baseline_drift
+                self._baselines[bucket] = baseline
+                ratio = latency / baseline if baseline > 0 else 1.0
+                self._ratio = ratio if self._ratio is None else (
+                    self.smoothing * ratio + (1 - self.smoothing) * self._ratio
+                )
+                if self._ratio > self.latency_tolerance:
+                    self._decrease()
+                else:
+                    self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+            self._cond.notify_all()
+
+    def _decrease(self):
+        now = time.monotonic()
+        if self._latency is not None and now - self._last_decrease < self._latency:
+            return
+        self._last_decrease = now
+        self._limit = max(self.min_limit, self._limit * self.backoff)
+
+    @contextmanager
+    def slot(self, stats=None):
+        # `stats` is filled by the backend inside the slot, its completion_tokens pick the baseline
+        self.acquire()
+        start = time.perf_counter()
+        latency, error = None, False
+        try:
+            yield
+            latency = time.perf_counter() - start
+        except ParseCancelled:
+            # a cancelled request says nothing about the server's load
+            raise
+        except Exception:
+            error = True
+            raise
+        finally:
+            completion_tokens = stats.get('completion_tokens') if stats is not None else None
+            self.release(latency=latency, error=error, completion_tokens=completion_tokens)
+
+    @asynccontextmanager
+    async def aslot(self, stats=None):
+        await self.aacquire()
+        start = time.perf_counter()
+        latency, error = None, False
+        try:
+            yield
+            latency = time.perf_counter() - start
+        except ParseCancelled:
+            # a cancelled request says nothing about the server's load
+            raise
+        except Exception:
+            error = True
+            raise
+        finally:
+            completion_tokens = stats.get('completion_tokens') if stats is not None else None
+            self.release(latency=latency, error=error, completion_tokens=completion_tokens)
@@ -0,0 +1,75 @@
+import random
+import threading
+from collections import deque
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def retryable_errors():
+    """
+    Transient failures worth another attempt: connection resets, timeouts, 5xx and 429.
+    Resolved on first use so that importing this module does not pull in openai.
+    """
+    import openai
+    return (
+        openai.APIConnectionError,
+        openai.InternalServerError,
+        openai.RateLimitError,
+        TimeoutError,
+    )
+
+
+def __getattr__(name):
+    if name == "RETRYABLE_ERRORS":
+        return retryable_errors()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class RetryPolicy:
+    """
+    Retry settings for model calls.
+
+    Args:
+        max_retries: Attempts made after the first one fails, 0 disables retries.
+        backoff_base: Backoff ceiling in seconds for the first retry, doubled for each further retry.
+        backoff_max: Upper bound of the backoff ceiling.
+        timeout: Per-request timeout in seconds, None keeps the client default.
+    """
+
+    def __init__(self, max_retries=3, backoff_base=0.5, backoff_max=8.0, timeout=None):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+
+    def backoff(self, attempt):
+        # "full jitter": uniform over [0, ceiling] so retrying clients do not synchronise
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def should_retry(self, error, attempt):
+        return attempt < self.max_retries and isinstance(error, retryable_errors())
+
+
+class LatencyTracker:
+    """
+    Thread-safe rolling window of request latencies, used to derive the hedging delay.
+    """
+
+    def __init__(self, window=256, min_samples=16):
+        self.min_samples = min_samples
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def quantile(self, q):
+        """
+        Returns the q-quantile of the window, or None until `min_samples` latencies are recorded.
+        """
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            latencies = sorted(self._latencies)
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
@@ -0,0 +1,153 @@
+import time
+import asyncio
+import threading
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+# share of the request slots each class gets while both are waiting
+DEFAULT_PRIORITY_WEIGHTS = {INTERACTIVE: 8, BULK: 1}
+
+
+class _Ticket:
+    def __init__(self, scheduler, loop=None):
+        self.scheduler = scheduler
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+
+    def grant(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._set_result)
+
+    def _set_result(self):
+        if self.future.cancelled():
+            # the waiter gave up after the slot was handed to it
+            self.scheduler.release()
+        else:
+            self.future.set_result(None)
+
+
+class PriorityScheduler:
+    """
+    Admits model requests by priority class with weighted fair dequeuing (stride scheduling).
+
+    At most `max_concurrency` requests are in flight. When they are all taken, requests wait in
+    one FIFO queue per class and every freed slot goes to the waiting class with the smallest
+    pass value, which then advances by 1 / weight. With the default weights interactive pages
+    get 8 slots for every bulk one while both wait, and bulk work still always progresses.
+
+    Args:
+        max_concurrency: Number of requests in flight, an int or a callable returning the
+            current limit (e.g. of an adaptive limiter).
+        weights: Dict from class name to weight, see DEFAULT_PRIORITY_WEIGHTS.
+    """
+
+    def __init__(self, max_concurrency, weights=None):
+        self.weights = dict(weights or DEFAULT_PRIORITY_WEIGHTS)
+        assert all(weight > 0 for weight in self.weights.values()), f"priority weights must be positive: {self.weights}"
+        self._max_concurrency = max_concurrency
+        self._queues = {priority: deque() for priority in self.weights}
+        self._pass = {priority: 0.0 for priority in self.weights}
+        self._virtual_time = 0.0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def max_concurrency(self):
+        limit = self._max_concurrency() if callable(self._max_concurrency) else self._max_concurrency
+        return max(1, limit)
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def queued(self, priority=None):
+        with self._lock:
+            if priority is not None:
+                return len(self._queues[priority])
+            return sum(len(queue) for queue in self._queues.values())
+
+    def _check(self, priority):
+        if priority not in self.weights:
+            raise ValueError(f"unknown priority {priority}, expected one of {list(self.weights)}")
+
+    def _try_admit(self, priority, ticket):
+        # under the lock: take a free slot, or queue the ticket
+        if self._in_flight < self.max_concurrency and not any(self._queues.values()):
+            self._in_flight += 1
+            return True
+        queue = self._queues[priority]
+        if not queue:
+            # an idle class does not bank credit while it had nothing to send
+            self._pass[priority] = max(self._pass[priority], self._virtual_time)
+        queue.append(ticket)
+        return False
+
+    def _dispatch(self):
+        # under the lock: hand free slots to the waiting classes in stride order
+        while self._in_flight < self.max_concurrency:
+            waiting = [priority for priority, queue in self._queues.items() if queue]
+            if not waiting:
+                return
+            priority = min(waiting, key=lambda p: self._pass[p])
+            self._virtual_time = self._pass[priority]
+            self._pass[priority] += 1 / self.weights[priority]
+            self._in_flight += 1
+            self._queues[priority].popleft().grant()
+
+    def acquire(self, priority=BULK):
+        self._check(priority)
+        ticket = _Ticket(self)
+        with self._lock:
+            if self._try_admit(priority, ticket):
+                return
+        ticket.event.wait()
+
+    async def aacquire(self, priority=BULK):
+        self._check(priority)
+        ticket = _Ticket(self, loop=asyncio.get_running_loop())
+        with self._lock:
+            if self._try_admit(priority, ticket):
+                return
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            with self._lock:
+                if ticket in self._queues[priority]:
+                    self._queues[priority].remove(ticket)
+                    raise
+            if ticket.future.done() and not ticket.future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, priority=BULK, stats=None):
+        start = time.perf_counter()
+        self.acquire(priority)
+        if stats is not None:
+            stats.update({'priority': priority, 'queue_time': time.perf_counter() - start})
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self, priority=BULK, stats=None):
+        start = time.perf_counter()
+        await self.aacquire(priority)
+        if stats is not None:
+            stats.update({'priority': priority, 'queue_time': time.perf_counter() - start})
+        try:
+            yield
+        finally:
+            self.release()
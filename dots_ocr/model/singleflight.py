@@ -0,0 +1,92 @@
+import asyncio
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls that share a key into one: the first caller runs the function,
+    callers arriving while it is in flight wait for it and get the same result (or exception).
+    A key is forgotten as soon as its call returns, so this is not a cache.
+
+    When the leading call fails with one of `retry_errors` or its task is cancelled, e.g. because
+    the job it belongs to was cancelled, the waiters do not inherit that and one of them retries.
+    """
+
+    def __init__(self, retry_errors=()):
+        self.retry_errors = retry_errors
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._futures = {}
+
+    def do(self, key, func, *args, **kwargs):
+        """
+        Returns (result, shared), `shared` is True when the result came from another caller's call.
+        """
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+            if leader:
+                break
+            call.done.wait()
+            if call.error is None:
+                return call.result, True
+            if not isinstance(call.error, self.retry_errors):
+                raise call.error
+
+        try:
+            call.result = func(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    async def ado(self, key, func, *args, **kwargs):
+        """
+        Asyncio version of `do`, `func` is a coroutine function. Calls are only shared within an event loop.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                future = self._futures.get((loop, key))
+                leader = future is None
+                if leader:
+                    future = self._futures[(loop, key)] = loop.create_future()
+            if leader:
+                break
+            try:
+                # a cancelled waiter must not cancel the call the others wait for
+                return await asyncio.shield(future), True
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+            except self.retry_errors:
+                pass
+
+        try:
+            result = await func(*args, **kwargs)
+            future.set_result(result)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # nobody may be waiting, mark it as retrieved
+            raise
+        finally:
+            with self._lock:
+                del self._futures[(loop, key)]
+        return result, False
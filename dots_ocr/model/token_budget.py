@@ -0,0 +1,122 @@
+import threading
+
+from PIL import Image
+
+from dots_ocr.utils.consts import IMAGE_FACTOR, MIN_PIXELS, MAX_PIXELS, MAX_MODEL_LEN, MIN_COMPLETION_TOKENS
+from dots_ocr.utils.image_utils import smart_resize
+
+
+def count_image_tokens(height, width, min_pixels=None, max_pixels=None):
+    """
+    Number of vision tokens the server spends on an image: one per 28x28 patch of the smart-resized image.
+    """
+    input_height, input_width = smart_resize(
+        height, width, factor=IMAGE_FACTOR, min_pixels=min_pixels or MIN_PIXELS, max_pixels=max_pixels or MAX_PIXELS
+    )
+    return input_height * input_width // (IMAGE_FACTOR * IMAGE_FACTOR)
+
+
+def estimate_prompt_tokens(prompt):
+    # ~4 characters per token for English, stay on the safe side and add the chat template
+    return len(prompt) // 3 + 64
+
+
+def ink_density(image: Image.Image, threshold=200, size=256) -> float:
+    """
+    Fraction of non-background pixels on a small grayscale thumbnail of the page.
+    """
+    thumbnail = image.convert('L')
+    thumbnail.thumbnail((size, size))
+    histogram = thumbnail.histogram()
+    return sum(histogram[:threshold]) / max(1, thumbnail.width * thumbnail.height)
+
+
+def context_token_budget(image_tokens, prompt, max_model_len=MAX_MODEL_LEN):
+    """
+    Output tokens that still fit in the context next to the image and the prompt.
+    """
+    return max_model_len - image_tokens - estimate_prompt_tokens(prompt)
+
+
+class TokenBudgetEstimator:
+    """
+    Learns, per prompt mode, how many output tokens a page needs from its amount of ink.
+
+    A least-squares line `tokens = a * ink_tokens + b` is fitted online, where `ink_tokens`
+    is the ink density times the image tokens of the page. Predictions are scaled by
+    `safety_factor` plus `margin` and are only made after `min_samples` observations.
+    """
+
+    def __init__(self, safety_factor=1.5, margin=256, min_samples=8):
+        self.safety_factor = safety_factor
+        self.margin = margin
+        self.min_samples = min_samples
+        self._sums = {}  # prompt_mode -> [n, sx, sy, sxx, sxy]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def page_features(image, image_tokens):
+        return ink_density(image) * image_tokens
+
+    def observe(self, prompt_mode, ink_tokens, completion_tokens):
+        with self._lock:
+            sums = self._sums.setdefault(prompt_mode, [0, 0.0, 0.0, 0.0, 0.0])
+            sums[0] += 1
+            sums[1] += ink_tokens
+            sums[2] += completion_tokens
+            sums[3] += ink_tokens * ink_tokens
+            sums[4] += ink_tokens * completion_tokens
+
+    def predict(self, prompt_mode, ink_tokens):
+        """
+        Returns the predicted output budget, or None while there is too little data.
+        """
+        with self._lock:
+            sums = self._sums.get(prompt_mode)
+            if sums is None or sums[0] < self.min_samples:
+                return None
+            n, sx, sy, sxx, sxy = sums
+        variance = n * sxx - sx * sx
+        if variance <= 0:
+            slope, intercept = 0.0, sy / n
+        else:
+            slope = (n * sxy - sx * sy) / variance
+            intercept = (sy - slope * sx) / n
+        return int(max(0.0, slope * ink_tokens + intercept) * self.safety_factor + self.margin)
+
+
+def token_budget(
+    image,
+    prompt,
+    prompt_mode,
+    mode_budget,
+    max_model_len=MAX_MODEL_LEN,
+    min_pixels=None,
+    max_pixels=None,
+    estimator=None,
+):
+    """
+    Computes the max_completion_tokens of one request.
+
+    Args:
+        image: The image sent to the model.
+        prompt: The prompt text.
+        prompt_mode: Key of the prompt, used by the estimator.
+        mode_budget: Static budget of the prompt mode.
+        max_model_len: Context length of the served model.
+        min_pixels: Minimum number of pixels of the server-side resize.
+        max_pixels: Maximum number of pixels of the server-side resize.
+        estimator: Optional TokenBudgetEstimator.
+
+    Returns:
+        (budget, ink_tokens), ink_tokens is None without an estimator.
+    """
+    image_tokens = count_image_tokens(image.height, image.width, min_pixels=min_pixels, max_pixels=max_pixels)
+    budget = min(mode_budget, context_token_budget(image_tokens, prompt, max_model_len=max_model_len))
+    ink_tokens = None
+    if estimator is not None:
+        ink_tokens = estimator.page_features(image, image_tokens)
+        predicted = estimator.predict(prompt_mode, ink_tokens)
+        if predicted is not None:
+            budget = min(budget, predicted)
+    return max(budget, MIN_COMPLETION_TOKENS), ink_tokens
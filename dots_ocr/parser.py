@@ -1,16 +1,28 @@
 import os
 import json
-from tqdm import tqdm
-from multiprocessing.pool import ThreadPool, Pool
+import time
+import asyncio
+import threading
+import functools
+from collections import deque
+from contextlib import nullcontext
 import argparse
 
 
-from dots_ocr.model.inference import inference_with_vllm
-from dots_ocr.utils.consts import image_extensions, MIN_PIXELS, MAX_PIXELS
-from dots_ocr.utils.image_utils import get_image_by_fitz_doc, fetch_image, smart_resize
-from dots_ocr.utils.doc_utils import fitz_doc_to_image, load_images_from_pdf
-from dots_ocr.utils.prompts import dict_promptmode_to_prompt
-from dots_ocr.utils.layout_utils import post_process_output, draw_layout_on_image, pre_process_bboxes
+from dots_ocr.model.backends import VLLMBackend, HFBackend, FakeBackend
+from dots_ocr.model.retry import RetryPolicy
+from dots_ocr.model.cache import ResponseCache, make_cache_key
+from dots_ocr.model.token_budget import TokenBudgetEstimator, token_budget
+from dots_ocr.model.limiter import AIMDLimiter
+from dots_ocr.model.singleflight import SingleFlight
+from dots_ocr.model.scheduler import PriorityScheduler, INTERACTIVE, BULK
+from dots_ocr.model.cancellation import CancellationToken, ParseCancelled, OK
+from dots_ocr.utils.consts import image_extensions, MIN_PIXELS, MAX_PIXELS, MAX_MODEL_LEN, CPU_MAX_PIXELS
+from dots_ocr.utils.image_utils import get_image_by_fitz_doc, fetch_image, smart_resize, ImageEncodePolicy
+from dots_ocr.utils.doc_utils import fitz_doc_to_image, PdfPageRenderer, new_render_pool, parse_page_selection, SupportedPdfParseMethod
+from dots_ocr.utils.text_layer import text_layer_response, fill_layout_text, TEXT_LAYER_PROMPT_MODES
+from dots_ocr.utils.prompts import dict_promptmode_to_prompt, dict_promptmode_to_max_tokens
+from dots_ocr.utils.layout_utils import post_process_output, post_process_cells, draw_layout_on_image, pre_process_bboxes, IncrementalLayoutParser
 from dots_ocr.utils.format_transformer import layoutjson2md
 
 
@@ -32,99 +44,267 @@ class DotsOCRParser:
             min_pixels=None,
             max_pixels=None,
             use_hf=False,
+            api_key=None,
+            endpoints=None,
+            endpoint_concurrency=None,
+            max_retries=3,
+            retry_backoff=0.5,
+            request_timeout=None,
+            hedge=False,
+            hedge_quantile=0.95,
+            image_encoding=None,
+            cache_dir=None,
+            cache_max_bytes=1 << 30,
+            max_model_len=MAX_MODEL_LEN,
+            adaptive_max_tokens=False,
+            backend=None,
+            adaptive_concurrency=False,
+            coalesce_requests=True,
+            priority_weights=None,
+            hf_max_batch_size=8,
+            hf_max_wait_ms=20,
+            hf_model_path="./weights/DotsOCR",
+            hf_profile="gpu",
+            hf_dtype=None,
+            hf_device=None,
+            hf_num_threads=None,
+            hf_quantization=None,
+            render_ahead=8,
+            render_workers=0,
+            pdf_parse_method="ocr",
         ):
         self.dpi = dpi
+        # pdf pages are rendered while earlier ones are parsed, at most this many beyond the ones in flight
+        self.render_ahead = render_ahead
+        # with more than one worker, pages are rasterised in a process pool started with the first pdf
+        self.render_workers = render_workers
+        self._render_pool = None
+        self._render_pool_lock = threading.Lock()
+        # 'auto' reads born-digital pdf pages from their text layer and only sends scanned ones to the model,
+        # 'hybrid' asks the model for the layout only and fills in the text from the text layer
+        assert pdf_parse_method in ("ocr", "auto", "hybrid"), f"pdf_parse_method should be 'ocr', 'auto' or 'hybrid', got {pdf_parse_method}"
+        self.pdf_parse_method = pdf_parse_method
 
         # default args for vllm server
-        self.ip = ip
-        self.port = port
+        self._ip = ip
+        self._port = port
+        self._follows_server = False
         self.model_name = model_name
         # default args for inference
         self.temperature = temperature
         self.top_p = top_p
         self.max_completion_tokens = max_completion_tokens
+        # per-page output budget: prompt mode budget capped by the context left next to the image tokens,
+        # optionally tightened by an estimator learned from the ink density of the pages seen so far
+        self.max_model_len = max_model_len
+        self.token_estimator = TokenBudgetEstimator() if adaptive_max_tokens else None
         self.num_thread = num_thread
         self.output_dir = output_dir
         self.min_pixels = min_pixels
         self.max_pixels = max_pixels
+        # semaphores reference their loop once used, so they are dropped by hand, see _async_semaphore
+        self._async_semaphores = {}
+        # optional content-addressed cache of model responses, shared through the file system
+        self.response_cache = ResponseCache(cache_dir, max_bytes=cache_max_bytes) if cache_dir else None
+        # identical pages in flight at the same time (blank separators, repeated covers) share one model call
+        self.single_flight = SingleFlight(retry_errors=(ParseCancelled,)) if coalesce_requests else None
 
         self.use_hf = use_hf
-        if self.use_hf:
-            self._load_hf_model()
-            print(f"use hf model, num_thread will be set to 1")
+        if backend is not None:
+            # any InferenceBackend, e.g. a FakeBackend to measure the pipeline without a GPU
+            self.backend = backend
+            print(f"use {self.backend.name} backend")
+        elif self.use_hf:
+            # pages of the parser threads are batched into one generate call; parsers of the same
+            # weights, dtype and device share one loaded model through the process-wide registry
+            self.backend = HFBackend(
+                model_path=hf_model_path,
+                max_batch_size=hf_max_batch_size,
+                max_wait_ms=hf_max_wait_ms,
+                profile=hf_profile,
+                dtype=hf_dtype,
+                device=hf_device,
+                num_threads=hf_num_threads,
+                quantization=hf_quantization,
+            )
+            if hf_profile == "cpu" and self.max_pixels is None:
+                # vision tokens dominate cpu prefill, bound them unless the caller chose a cap
+                self.max_pixels = CPU_MAX_PIXELS
+                print(f"cpu profile, max_pixels capped to {self.max_pixels}")
+            print(f"use hf model, batches of up to {hf_max_batch_size} pages, num_thread will be set to {self._max_concurrency()}")
         else:
+            # requests are routed over all endpoints by least outstanding requests, ip/port is the single-server default;
+            # retries with jittered backoff, optional hedging re-sends a request still running after the p95 latency
+            self.backend = VLLMBackend(
+                ip=self.ip,
+                port=self.port,
+                model_name=self.model_name,
+                api_key=api_key,
+                endpoints=endpoints,
+                endpoint_concurrency=endpoint_concurrency or self.num_thread,
+                retry_policy=RetryPolicy(max_retries=max_retries, backoff_base=retry_backoff, timeout=request_timeout),
+                hedge=hedge,
+                hedge_quantile=hedge_quantile,
+                # codec of the page images sent to the server, lossless PNG by default
+                image_encoding=image_encoding or ImageEncodePolicy(),
+            )
             print(f"use vllm model, num_thread will be set to {self.num_thread}")
+            endpoint_pool = self.backend.endpoint_pool
+            if len(endpoint_pool) > 1:
+                print(f"routing requests over endpoints: {', '.join(e.address for e in endpoint_pool.endpoints)}")
+            # without an endpoints list the backend follows ip/port, see set_server
+            self._follows_server = not endpoints
+        # optional AIMD limit on in-flight model requests, num_thread becomes its ceiling
+        self.limiter = None
+        if adaptive_concurrency:
+            max_limit = self._max_concurrency()
+            self.limiter = AIMDLimiter(initial_limit=min(8, max_limit), max_limit=max_limit)
+        # requests wait here, not at the server, so that interactive pages can overtake bulk ones;
+        # with an adaptive limiter the scheduler admits as many requests as its current limit
+        self.scheduler = PriorityScheduler(
+            (lambda: self.limiter.limit) if self.limiter is not None else self._max_concurrency(),
+            weights=priority_weights,
+        )
         assert self.min_pixels is None or self.min_pixels >= MIN_PIXELS
         assert self.max_pixels is None or self.max_pixels <= MAX_PIXELS
 
-    def _load_hf_model(self):
-        import torch
-        from transformers import AutoModelForCausalLM, AutoProcessor, AutoTokenizer
-        from qwen_vl_utils import process_vision_info
-
-        model_path = "./weights/DotsOCR"
-        self.model = AutoModelForCausalLM.from_pretrained(
-            model_path,
-            attn_implementation="flash_attention_2",
-            torch_dtype=torch.bfloat16,
-            device_map="auto",
-            trust_remote_code=True
-        )
-        self.processor = AutoProcessor.from_pretrained(model_path,  trust_remote_code=True,use_fast=True)
-        self.process_vision_info = process_vision_info
-
-    def _inference_with_hf(self, image, prompt):
-        messages = [
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "image",
-                        "image": image
-                    },
-                    {"type": "text", "text": prompt}
-                ]
-            }
-        ]
+    @property
+    def ip(self):
+        return self._ip
 
-        # Preparation for inference
-        text = self.processor.apply_chat_template(
-            messages, 
-            tokenize=False, 
-            add_generation_prompt=True
-        )
-        image_inputs, video_inputs = self.process_vision_info(messages)
-        inputs = self.processor(
-            text=[text],
-            images=image_inputs,
-            videos=video_inputs,
-            padding=True,
-            return_tensors="pt",
-        )
+    @ip.setter
+    def ip(self, ip):
+        self.set_server(ip, self._port)
 
-        inputs = inputs.to("cuda")
+    @property
+    def port(self):
+        return self._port
 
-        # Inference: Generation of the output
-        generated_ids = self.model.generate(**inputs, max_new_tokens=24000)
-        generated_ids_trimmed = [
-            out_ids[len(in_ids) :] for in_ids, out_ids in zip(inputs.input_ids, generated_ids)
-        ]
-        response = self.processor.batch_decode(
-            generated_ids_trimmed, skip_special_tokens=True, clean_up_tokenization_spaces=False
-        )[0]
-        return response
+    @port.setter
+    def port(self, port):
+        self.set_server(self._ip, port)
+
+    def set_server(self, ip, port):
+        """
+        Sends the following requests to the vllm server at `ip`:`port`. Parsers built with an
+        `endpoints` list keep routing over those.
+        """
+        if (ip, port) == (self._ip, self._port):
+            return
+        self._ip, self._port = ip, port
+        if self._follows_server:
+            self.backend.set_endpoints([(ip, int(port))])
+
+    def _pdf_renderer(self, input_path):
+        pool = None
+        if self.render_workers > 1:
+            with self._render_pool_lock:
+                if self._render_pool is None:
+                    self._render_pool = new_render_pool(self.render_workers)
+                pool = self._render_pool
+        return PdfPageRenderer(input_path, dpi=self.dpi, pool=pool)
+
+    def warmup(self):
+        """
+        Runs one dummy request through the backend so that the first real page does not pay
+        for model initialisation. Only the hf backend does anything here.
+        """
+        self.backend.warmup()
+
+    def close(self):
+        """Stops the pdf render workers and releases the backend (its hf model, hedging threads)."""
+        with self._render_pool_lock:
+            render_pool, self._render_pool = self._render_pool, None
+        if render_pool is not None:
+            render_pool.shutdown()
+        self.backend.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    async def aclose(self):
+        """
+        Releases what the asyncio API holds on the running event loop (the async http clients
+        and the semaphores), call it once no parse is in flight on the loop.
+        """
+        self._async_semaphores.pop(asyncio.get_running_loop(), None)
+        await self.backend.aclose()
+
+    async def __aenter__(self):
+        return self
 
-    def _inference_with_vllm(self, image, prompt):
-        response = inference_with_vllm(
+    async def __aexit__(self, *exc):
+        await self.aclose()
+        self.close()
+
+    def _token_budget(self, image, prompt, prompt_mode, min_pixels=None, max_pixels=None):
+        mode_budget = min(self.max_completion_tokens, dict_promptmode_to_max_tokens.get(prompt_mode, self.max_completion_tokens))
+        return token_budget(
             image,
-            prompt, 
-            model_name=self.model_name,
-            ip=self.ip,
-            port=self.port,
-            temperature=self.temperature,
-            top_p=self.top_p,
-            max_completion_tokens=self.max_completion_tokens,
+            prompt,
+            prompt_mode,
+            mode_budget,
+            max_model_len=self.max_model_len,
+            min_pixels=min_pixels,
+            max_pixels=max_pixels,
+            estimator=self.token_estimator,
+        )
+
+    def _observe_tokens(self, prompt_mode, ink_tokens, response, stats):
+        if self.token_estimator is None or ink_tokens is None or response is None:
+            return
+        # cached responses come without usage, approximate it from the text length
+        completion_tokens = stats.get('completion_tokens')
+        if completion_tokens is None:
+            completion_tokens = len(response) / 3
+        self.token_estimator.observe(prompt_mode, ink_tokens, completion_tokens)
+
+    def _max_concurrency(self):
+        return min(self.num_thread, self.backend.max_concurrency or self.num_thread)
+
+    def _sampling_params(self, max_completion_tokens=None):
+        return {
+            'temperature': self.temperature,
+            'top_p': self.top_p,
+            'max_completion_tokens': max_completion_tokens or self.max_completion_tokens,
+        }
+
+    def _cache_key(self, image, prompt, params):
+        return make_cache_key(image, prompt, backend=self.backend.name, model_name=self.model_name, **params)
+
+    def _inference(self, image, prompt, stats, max_completion_tokens=None, priority=BULK, cancel_token=None):
+        params = self._sampling_params(max_completion_tokens)
+        stats['max_completion_tokens'] = params['max_completion_tokens']
+        cache_key = None
+        if self.response_cache is not None or self.single_flight is not None:
+            cache_key = self._cache_key(image, prompt, params)
+        if self.response_cache is not None:
+            response = self.response_cache.get(cache_key)
+            stats.update({'cache_hits': int(response is not None), 'cache_misses': int(response is None)})
+            if response is not None:
+                return response
+        if self.single_flight is None:
+            return self._call_backend(image, prompt, params, stats, cache_key, priority, cancel_token)
+        # only the leading call fills `stats` with the backend accounting
+        response, shared = self.single_flight.do(
+            cache_key, self._call_backend, image, prompt, params, stats, cache_key, priority, cancel_token
         )
+        stats['coalesced'] = int(shared)
+        return response
+
+    def _call_backend(self, image, prompt, params, stats, cache_key=None, priority=BULK, cancel_token=None):
+        with self.scheduler.slot(priority, stats=stats), self.limiter.slot(stats=stats) if self.limiter is not None else nullcontext():
+            if self.limiter is not None:
+                stats['concurrency_limit'] = self.limiter.limit
+            if cancel_token is not None:
+                # the job may have been cancelled while the page was queued
+                cancel_token.raise_if_cancelled()
+            response = self.backend.infer(image, prompt, params, stats=stats, cancel_token=cancel_token)
+        if self.response_cache is not None and response is not None:
+            self.response_cache.put(cache_key, response)
         return response
 
     def get_prompt(self, prompt_mode, bbox=None, origin_image=None, image=None, min_pixels=None, max_pixels=None):
@@ -136,18 +316,7 @@ class DotsOCRParser:
             prompt = prompt + str(bbox)
         return prompt
 
-    # def post_process_results(self, response, prompt_mode, save_dir, save_name, origin_image, image, min_pixels, max_pixels)
-    def _parse_single_image(
-        self, 
-        origin_image, 
-        prompt_mode, 
-        save_dir, 
-        save_name, 
-        source="image", 
-        page_idx=0, 
-        bbox=None,
-        fitz_preprocess=False,
-        ):
+    def _prepare_image(self, origin_image, prompt_mode, source="image", bbox=None, fitz_preprocess=False):
         min_pixels, max_pixels = self.min_pixels, self.max_pixels
         if prompt_mode == "prompt_grounding_ocr":
             min_pixels = min_pixels or MIN_PIXELS  # preprocess image to the final input
@@ -160,12 +329,192 @@ class DotsOCRParser:
             image = fetch_image(image, min_pixels=min_pixels, max_pixels=max_pixels)
         else:
             image = fetch_image(origin_image, min_pixels=min_pixels, max_pixels=max_pixels)
-        input_height, input_width = smart_resize(image.height, image.width)
         prompt = self.get_prompt(prompt_mode, bbox, origin_image, image, min_pixels=min_pixels, max_pixels=max_pixels)
-        if self.use_hf:
-            response = self._inference_with_hf(image, prompt)
+        return image, prompt, min_pixels, max_pixels
+
+    def _parse_single_image(
+        self, 
+        origin_image, 
+        prompt_mode, 
+        save_dir, 
+        save_name, 
+        source="image", 
+        page_idx=0, 
+        bbox=None,
+        fitz_preprocess=False,
+        priority=BULK,
+        cancel_token=None,
+        text_layer=None,
+        ):
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        image, prompt, min_pixels, max_pixels = self._prepare_image(
+            origin_image, prompt_mode, source=source, bbox=bbox, fitz_preprocess=fitz_preprocess
+        )
+        stats = {}
+        if self._is_hybrid(text_layer):
+            response = self._hybrid_response(
+                origin_image, image, text_layer, stats, source=source, min_pixels=min_pixels, max_pixels=max_pixels,
+                priority=priority, cancel_token=cancel_token,
+            )
         else:
-            response = self._inference_with_vllm(image, prompt)
+            response = self._text_layer_response(text_layer, image, prompt_mode, stats, min_pixels=min_pixels, max_pixels=max_pixels)
+        if response is None:
+            max_completion_tokens, ink_tokens = self._token_budget(image, prompt, prompt_mode, min_pixels=min_pixels, max_pixels=max_pixels)
+            response = self._inference(
+                image, prompt, stats, max_completion_tokens=max_completion_tokens, priority=priority, cancel_token=cancel_token
+            )
+            self._observe_tokens(prompt_mode, ink_tokens, response, stats)
+        result = self._post_process_result(
+            response, origin_image, image, prompt_mode, save_dir, save_name,
+            source=source, page_idx=page_idx, min_pixels=min_pixels, max_pixels=max_pixels,
+        )
+        result.update(stats)
+        result['status'] = OK
+        return result
+
+    def _uses_text_layer(self, prompt_mode):
+        if self.pdf_parse_method == "hybrid":
+            return prompt_mode == "prompt_layout_all_en"
+        return self.pdf_parse_method == "auto" and prompt_mode in TEXT_LAYER_PROMPT_MODES
+
+    def _is_hybrid(self, text_layer):
+        return self.pdf_parse_method == "hybrid" and text_layer is not None and text_layer['readable']
+
+    @staticmethod
+    def _model_input_size(image, min_pixels=None, max_pixels=None):
+        # the size the model sees and answers bboxes in, post_process_cells scales them back from it
+        input_height, input_width = smart_resize(
+            image.height, image.width, min_pixels=min_pixels or MIN_PIXELS, max_pixels=max_pixels or MAX_PIXELS
+        )
+        return input_width, input_height
+
+    def _hybrid_layout(self, response, input_size, text_layer, stats):
+        """
+        Cells of a prompt_layout_only_en answer with their text filled in from the text layer,
+        and the indices of the cells left for prompt_grounding_ocr. None when the answer is not
+        a layout, the page then goes through prompt_layout_all_en.
+        """
+        try:
+            cells = json.loads(response)
+            assert isinstance(cells, list) and len(cells) > 0
+            assert all(isinstance(cell, dict) and len(cell.get('bbox', [])) == 4 and 'category' in cell for cell in cells)
+        except Exception as e:
+            print(f"hybrid layout of a page could not be read ({e}), parsing it with prompt_layout_all_en")
+            return None
+        pending = fill_layout_text(text_layer, cells, *input_size)
+        stats.update({'parse_method': SupportedPdfParseMethod.HYBRID.value, 'grounded_regions': len(pending)})
+        return cells, pending
+
+    def _grounding_request(self, origin_image, input_size, cell, source="pdf"):
+        # the cell bbox is in model input coordinates, get_prompt expects it in the original image
+        scale_x, scale_y = origin_image.width / input_size[0], origin_image.height / input_size[1]
+        x0, y0, x1, y1 = cell['bbox']
+        bbox = [int(x0 * scale_x), int(y0 * scale_y), int(x1 * scale_x), int(y1 * scale_y)]
+        region_image, prompt, min_pixels, max_pixels = self._prepare_image(origin_image, "prompt_grounding_ocr", source=source, bbox=bbox)
+        max_completion_tokens, _ = self._token_budget(region_image, prompt, "prompt_grounding_ocr", min_pixels=min_pixels, max_pixels=max_pixels)
+        return region_image, prompt, max_completion_tokens
+
+    @staticmethod
+    def _add_region_stats(stats, region_stats):
+        # the page accounts for the tokens of its grounding calls, timings stay those of the layout call
+        for key in ('prompt_tokens', 'completion_tokens'):
+            if region_stats.get(key) is not None:
+                stats[key] = (stats.get(key) or 0) + region_stats[key]
+
+    def _hybrid_response(
+        self, origin_image, image, text_layer, stats, source="pdf", min_pixels=None, max_pixels=None, priority=BULK, cancel_token=None
+        ):
+        """
+        prompt_layout_all_en answer of a page with a readable text layer: the model only detects
+        the layout, the text comes from the text layer and formulas, tables and regions without
+        text are read by the model one bbox at a time. None when the layout could not be read.
+        """
+        prompt = dict_promptmode_to_prompt["prompt_layout_only_en"]
+        max_completion_tokens, ink_tokens = self._token_budget(
+            image, prompt, "prompt_layout_only_en", min_pixels=min_pixels, max_pixels=max_pixels
+        )
+        response = self._inference(
+            image, prompt, stats, max_completion_tokens=max_completion_tokens, priority=priority, cancel_token=cancel_token
+        )
+        self._observe_tokens("prompt_layout_only_en", ink_tokens, response, stats)
+        input_size = self._model_input_size(image, min_pixels=min_pixels, max_pixels=max_pixels)
+        layout = self._hybrid_layout(response, input_size, text_layer, stats)
+        if layout is None:
+            return None
+        cells, pending = layout
+        for index in pending:
+            region_image, region_prompt, region_tokens = self._grounding_request(origin_image, input_size, cells[index], source=source)
+            region_stats = {}
+            text = self._inference(
+                region_image, region_prompt, region_stats, max_completion_tokens=region_tokens, priority=priority, cancel_token=cancel_token
+            )
+            self._add_region_stats(stats, region_stats)
+            cells[index]['text'] = (text or "").strip()
+        return json.dumps(cells, ensure_ascii=False)
+
+    async def _ahybrid_response(
+        self, origin_image, image, text_layer, stats, source="pdf", min_pixels=None, max_pixels=None, priority=BULK, cancel_token=None
+        ):
+        prompt = dict_promptmode_to_prompt["prompt_layout_only_en"]
+        max_completion_tokens, ink_tokens = await self._run_in_executor(
+            self._token_budget, image, prompt, "prompt_layout_only_en", min_pixels=min_pixels, max_pixels=max_pixels
+        )
+        response = await self._ainference(
+            image, prompt, stats, max_completion_tokens=max_completion_tokens, priority=priority, cancel_token=cancel_token
+        )
+        self._observe_tokens("prompt_layout_only_en", ink_tokens, response, stats)
+        input_size = self._model_input_size(image, min_pixels=min_pixels, max_pixels=max_pixels)
+        layout = self._hybrid_layout(response, input_size, text_layer, stats)
+        if layout is None:
+            return None
+        cells, pending = layout
+
+        async def _ground(index):
+            region_image, region_prompt, region_tokens = await self._run_in_executor(
+                self._grounding_request, origin_image, input_size, cells[index], source=source
+            )
+            region_stats = {}
+            text = await self._ainference(
+                region_image, region_prompt, region_stats, max_completion_tokens=region_tokens, priority=priority, cancel_token=cancel_token
+            )
+            self._add_region_stats(stats, region_stats)
+            cells[index]['text'] = (text or "").strip()
+
+        await asyncio.gather(*[_ground(index) for index in pending])
+        return json.dumps(cells, ensure_ascii=False)
+
+    def _text_layer_response(self, text_layer, image, prompt_mode, stats, min_pixels=None, max_pixels=None):
+        """
+        Answer of a born-digital page written from its pdf text layer in the model's output format,
+        None when the page needs the model.
+        """
+        if text_layer is None:
+            return None
+        stats['parse_method'] = text_layer['method'].value
+        if text_layer['method'] != SupportedPdfParseMethod.TXT:
+            return None
+        input_width, input_height = self._model_input_size(image, min_pixels=min_pixels, max_pixels=max_pixels)
+        return text_layer_response(text_layer, prompt_mode, input_width, input_height)
+
+    def _cancelled_result(self, page_idx, reason):
+        # placeholder of a page that was not parsed because its job was cancelled
+        return {'page_no': page_idx, 'status': reason}
+
+    def _post_process_result(
+        self,
+        response,
+        origin_image,
+        image,
+        prompt_mode,
+        save_dir,
+        save_name,
+        source="image",
+        page_idx=0,
+        min_pixels=None,
+        max_pixels=None,
+        ):
+        input_height, input_width = smart_resize(image.height, image.width)
         result = {'page_no': page_idx,
             "input_height": input_height,
             "input_width": input_width
@@ -249,42 +598,111 @@ class DotsOCRParser:
 
         return result
     
-    def parse_image(self, input_path, filename, prompt_mode, save_dir, bbox=None, fitz_preprocess=False):
+    def parse_image(
+        self, input_path, filename, prompt_mode, save_dir, bbox=None, fitz_preprocess=False, priority=INTERACTIVE, cancel_token=None
+        ):
         origin_image = fetch_image(input_path)
-        result = self._parse_single_image(origin_image, prompt_mode, save_dir, filename, source="image", bbox=bbox, fitz_preprocess=fitz_preprocess)
+        try:
+            result = self._parse_single_image(
+                origin_image, prompt_mode, save_dir, filename, source="image", bbox=bbox, fitz_preprocess=fitz_preprocess,
+                priority=priority, cancel_token=cancel_token,
+            )
+        except ParseCancelled as e:
+            result = self._cancelled_result(0, e.reason)
         result['file_path'] = input_path
         return [result]
         
-    def parse_pdf(self, input_path, filename, prompt_mode, save_dir):
+    def parse_pdf(self, input_path, filename, prompt_mode, save_dir, priority=BULK, cancel_token=None, pages=None):
+        """
+        Parses the selected pages of a pdf. Once `cancel_token` fires no further page is sent to
+        the model, in-flight requests are aborted and the cancelled pages are returned with the
+        token's reason as "status" next to the pages already parsed (status "ok").
+
+        `pages` selects the pages to parse, e.g. "1-5,9,12-" (1-based, see parse_page_selection),
+        every page by default. Pages that are not selected are never rendered and each result
+        keeps the page's index in the document as "page_no".
+
+        Pages are rendered on demand while earlier ones are parsed: a page takes a slot before it
+        is rendered and gives it back once its result is written, so at most `render_ahead` pages
+        beyond the ones being parsed are held in memory.
+        """
         print(f"loading pdf: {input_path}")
-        images_origin = load_images_from_pdf(input_path, dpi=self.dpi)
-        total_pages = len(images_origin)
-        tasks = [
-            {
-                "origin_image": image,
-                "prompt_mode": prompt_mode,
-                "save_dir": save_dir,
-                "save_name": filename,
-                "source":"pdf",
-                "page_idx": i,
-            } for i, image in enumerate(images_origin)
-        ]
+        renderer = self._pdf_renderer(input_path)
+        try:
+            page_indices = parse_page_selection(pages, len(renderer))
+        except ValueError:
+            renderer.close()
+            raise
+        total_pages = len(page_indices)
+        num_thread = max(1, min(total_pages, self._max_concurrency()))
+        slots = threading.Semaphore(num_thread + self.render_ahead)
+        stop = threading.Event()
+
+        def _submit(i):
+            # nothing more is rendered for a cancelled job, _parse_single_image turns the page into a stub
+            if cancel_token is not None and cancel_token.cancelled:
+                return i, None
+            return i, renderer.submit(i)
+
+        def _tasks():
+            # iterated by the pool's task handler thread, so rendering overlaps with inference;
+            # every free slot submits a page, which starts rendering right away with render workers
+            rendering = deque()
+            next_page = 0
+            while next_page < total_pages or rendering:
+                while next_page < total_pages and slots.acquire(blocking=False):
+                    rendering.append(_submit(page_indices[next_page]))
+                    next_page += 1
+                if not rendering:
+                    if not slots.acquire(timeout=0.1):
+                        if stop.is_set():
+                            return
+                        continue
+                    rendering.append(_submit(page_indices[next_page]))
+                    next_page += 1
+                i, page = rendering.popleft()
+                yield {
+                    "origin_image": page.result() if page is not None else None,
+                    "prompt_mode": prompt_mode,
+                    "save_dir": save_dir,
+                    "save_name": filename,
+                    "source":"pdf",
+                    "page_idx": i,
+                    "priority": priority,
+                    "cancel_token": cancel_token,
+                }
+
+        use_text_layer = self._uses_text_layer(prompt_mode)
 
         def _execute_task(task_args):
-            return self._parse_single_image(**task_args)
+            try:
+                if use_text_layer and task_args["origin_image"] is not None:
+                    task_args = dict(task_args, text_layer=renderer.analyze(task_args["page_idx"]))
+                return self._parse_single_image(**task_args)
+            except ParseCancelled as e:
+                return self._cancelled_result(task_args["page_idx"], e.reason)
 
-        if self.use_hf:
-            num_thread =  1
-        else:
-            num_thread = min(total_pages, self.num_thread)
         print(f"Parsing PDF with {total_pages} pages using {num_thread} threads...")
 
+        from tqdm import tqdm
+        from multiprocessing.pool import ThreadPool
+
         results = []
-        with ThreadPool(num_thread) as pool:
-            with tqdm(total=total_pages, desc="Processing PDF pages") as pbar:
-                for result in pool.imap_unordered(_execute_task, tasks):
-                    results.append(result)
-                    pbar.update(1)
+        try:
+            with ThreadPool(num_thread) as pool:
+                try:
+                    with tqdm(total=total_pages, desc="Processing PDF pages") as pbar:
+                        for result in pool.imap_unordered(_execute_task, _tasks()):
+                            slots.release()
+                            results.append(result)
+                            pbar.update(1)
+                            if self.limiter is not None:
+                                pbar.set_postfix(limit=self.limiter.limit)
+                finally:
+                    # the pool joins its task handler on exit, which may be waiting for a slot
+                    stop.set()
+        finally:
+            renderer.close()
 
         results.sort(key=lambda x: x["page_no"])
         for i in range(len(results)):
@@ -296,28 +714,373 @@ class DotsOCRParser:
         output_dir="", 
         prompt_mode="prompt_layout_all_en",
         bbox=None,
-        fitz_preprocess=False
+        fitz_preprocess=False,
+        priority=None,
+        deadline=None,
+        cancel_token=None,
+        pages=None,
         ):
+        """
+        `priority` is 'interactive' or 'bulk', by default images are interactive and pdfs bulk.
+
+        `pages` selects the pages of a pdf to parse, e.g. "1-5,9,12-", see `parse_pdf`.
+
+        `deadline` is a `time.time()` timestamp and `cancel_token` a CancellationToken to stop the
+        job from another thread. Either way the pages parsed so far are returned and saved, the
+        others with a "status" of 'deadline_exceeded' or 'cancelled', see `parse_pdf`.
+        """
+        if deadline is not None:
+            cancel_token = CancellationToken(deadline=deadline, parent=cancel_token)
         output_dir = output_dir or self.output_dir
         output_dir = os.path.abspath(output_dir)
         filename, file_ext = os.path.splitext(os.path.basename(input_path))
         save_dir = os.path.join(output_dir, filename)
         os.makedirs(save_dir, exist_ok=True)
 
+        start = time.perf_counter()
         if file_ext == '.pdf':
-            results = self.parse_pdf(input_path, filename, prompt_mode, save_dir)
+            results = self.parse_pdf(
+                input_path, filename, prompt_mode, save_dir, priority=priority or BULK, cancel_token=cancel_token, pages=pages,
+            )
         elif file_ext in image_extensions:
-            results = self.parse_image(input_path, filename, prompt_mode, save_dir, bbox=bbox, fitz_preprocess=fitz_preprocess)
+            results = self.parse_image(
+                input_path, filename, prompt_mode, save_dir, bbox=bbox, fitz_preprocess=fitz_preprocess,
+                priority=priority or INTERACTIVE, cancel_token=cancel_token,
+            )
         else:
             raise ValueError(f"file extension {file_ext} not supported, supported extensions are {image_extensions} and pdf")
+        summary = self._document_summary(input_path, results, time.perf_counter() - start)
         
         print(f"Parsing finished, results saving to {save_dir}")
+        self._save_results_jsonl(output_dir, filename, results, summary=summary)
+        return results
+
+    def parse_image_stream(self, input_path, filename, prompt_mode, save_dir, bbox=None, fitz_preprocess=False):
+        """
+        Streaming version of `parse_image`, backends without streaming deliver the response at once.
+
+        Yields every layout cell, already mapped to the original image coordinates, as soon as
+        the model closes it. The usual outputs are written once the response is complete and the
+        result list is the return value of the generator.
+        """
+        origin_image = fetch_image(input_path)
+        image, prompt, min_pixels, max_pixels = self._prepare_image(
+            origin_image, prompt_mode, source="image", bbox=bbox, fitz_preprocess=fitz_preprocess
+        )
+        max_completion_tokens, _ = self._token_budget(image, prompt, prompt_mode, min_pixels=min_pixels, max_pixels=max_pixels)
+        stats = {'max_completion_tokens': max_completion_tokens}
+        layout_parser = IncrementalLayoutParser()
+        for chunk in self.backend.stream(image, prompt, self._sampling_params(max_completion_tokens), stats=stats):
+            cells = layout_parser.feed(chunk)
+            if cells and prompt_mode in ['prompt_layout_all_en', 'prompt_layout_only_en']:
+                yield from post_process_cells(
+                    origin_image, cells, image.width, image.height, min_pixels=min_pixels, max_pixels=max_pixels
+                )
+        result = self._post_process_result(
+            layout_parser.text, origin_image, image, prompt_mode, save_dir, filename,
+            source="image", min_pixels=min_pixels, max_pixels=max_pixels,
+        )
+        result.update(stats)
+        result['file_path'] = input_path
+        return [result]
+
+    def parse_file_stream(self,
+        input_path,
+        output_dir="",
+        prompt_mode="prompt_layout_all_en",
+        bbox=None,
+        fitz_preprocess=False
+        ):
+        """
+        Streaming version of `parse_file` for image inputs, see `parse_image_stream`.
+        """
+        output_dir = output_dir or self.output_dir
+        output_dir = os.path.abspath(output_dir)
+        filename, file_ext = os.path.splitext(os.path.basename(input_path))
+        if file_ext not in image_extensions:
+            raise ValueError(f"streaming only supports image inputs {image_extensions}, got {file_ext}")
+        save_dir = os.path.join(output_dir, filename)
+        os.makedirs(save_dir, exist_ok=True)
+
+        start = time.perf_counter()
+        results = yield from self.parse_image_stream(input_path, filename, prompt_mode, save_dir, bbox=bbox, fitz_preprocess=fitz_preprocess)
+        summary = self._document_summary(input_path, results, time.perf_counter() - start)
+        print(f"Parsing finished, results saving to {save_dir}")
+        self._save_results_jsonl(output_dir, filename, results, summary=summary)
+        return results
+
+    def _document_summary(self, input_path, results, elapsed):
+        """
+        Throughput of one document, written as the last line of its .jsonl under the "summary" key.
+        Token counts only cover the pages whose backend reported a usage (no cache hits).
+        """
+        num_pages = len(results)
+        completion_tokens = sum(result.get('completion_tokens') or 0 for result in results)
+        statuses = [result.get('status', OK) for result in results]
+        completed_pages = statuses.count(OK)
+        summary = {
+            'file_path': input_path,
+            # 'ok', or why the job stopped early ('cancelled', 'deadline_exceeded')
+            'status': next((status for status in statuses if status != OK), OK),
+            'num_pages': num_pages,
+            'completed_pages': completed_pages,
+            'elapsed': elapsed,
+            'pages_per_second': completed_pages / elapsed if elapsed > 0 else None,
+            'prompt_tokens': sum(result.get('prompt_tokens') or 0 for result in results),
+            'completion_tokens': completion_tokens,
+            'completion_tokens_per_second': completion_tokens / elapsed if elapsed > 0 else None,
+            'truncated_pages': sum(1 for result in results if result.get('finish_reason') == 'length'),
+            'coalesced_calls': sum(result.get('coalesced') or 0 for result in results),
+            'text_layer_pages': sum(1 for result in results if result.get('parse_method') == SupportedPdfParseMethod.TXT.value),
+            'hybrid_pages': sum(1 for result in results if result.get('parse_method') == SupportedPdfParseMethod.HYBRID.value),
+            'grounded_regions': sum(result.get('grounded_regions') or 0 for result in results),
+        }
+        if summary['status'] != OK:
+            print(f"parsing stopped early ({summary['status']}), {completed_pages}/{num_pages} pages parsed")
+        print(
+            f"{completed_pages} pages in {elapsed:.2f}s, {completed_pages / max(elapsed, 1e-9):.2f} pages/s, "
+            f"{completion_tokens / max(elapsed, 1e-9):.1f} tokens/s, {summary['truncated_pages']} truncated"
+        )
+        return summary
+
+    def _save_results_jsonl(self, output_dir, filename, results, summary=None):
         with open(os.path.join(output_dir, os.path.basename(filename)+'.jsonl'), 'w', encoding="utf-8") as w:
             for result in results:
                 w.write(json.dumps(result, ensure_ascii=False) + '\n')
+            if summary is not None:
+                w.write(json.dumps({'summary': summary}, ensure_ascii=False) + '\n')
+
+    # ---------------- asyncio API ----------------
+
+    def _async_semaphore(self, priority=BULK):
+        # one semaphore per event loop and priority class, shared by every document parsed on it;
+        # the classes are arbitrated by the scheduler, so bulk pages never hold back interactive ones here
+        loop = asyncio.get_running_loop()
+        for closed in [l for l in self._async_semaphores if l.is_closed()]:
+            del self._async_semaphores[closed]
+        semaphores = self._async_semaphores.setdefault(loop, {})
+        semaphore = semaphores.get(priority)
+        if semaphore is None:
+            semaphore = semaphores[priority] = asyncio.Semaphore(self._max_concurrency())
+        return semaphore
+
+    async def _run_in_executor(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+    async def _ainference(self, image, prompt, stats, max_completion_tokens=None, priority=BULK, cancel_token=None):
+        params = self._sampling_params(max_completion_tokens)
+        stats['max_completion_tokens'] = params['max_completion_tokens']
+        cache_key = None
+        if self.response_cache is not None or self.single_flight is not None:
+            cache_key = await self._run_in_executor(self._cache_key, image, prompt, params)
+        if self.response_cache is not None:
+            response = await self._run_in_executor(self.response_cache.get, cache_key)
+            stats.update({'cache_hits': int(response is not None), 'cache_misses': int(response is None)})
+            if response is not None:
+                return response
+        if self.single_flight is None:
+            return await self._acall_backend(image, prompt, params, stats, cache_key, priority, cancel_token)
+        response, shared = await self.single_flight.ado(
+            cache_key, self._acall_backend, image, prompt, params, stats, cache_key, priority, cancel_token
+        )
+        stats['coalesced'] = int(shared)
+        return response
+
+    async def _acall_backend(self, image, prompt, params, stats, cache_key=None, priority=BULK, cancel_token=None):
+        async with self.scheduler.aslot(priority, stats=stats), self.limiter.aslot(stats=stats) if self.limiter is not None else nullcontext():
+            if self.limiter is not None:
+                stats['concurrency_limit'] = self.limiter.limit
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            response = await self.backend.ainfer(image, prompt, params, stats=stats, cancel_token=cancel_token)
+        if self.response_cache is not None and response is not None:
+            await self._run_in_executor(self.response_cache.put, cache_key, response)
+        return response
+
+    async def _aparse_single_image(
+        self,
+        origin_image,
+        prompt_mode,
+        save_dir,
+        save_name,
+        source="image",
+        page_idx=0,
+        bbox=None,
+        fitz_preprocess=False,
+        priority=BULK,
+        cancel_token=None,
+        text_layer=None,
+        ):
+        async with self._async_semaphore(priority):
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            image, prompt, min_pixels, max_pixels = await self._run_in_executor(
+                self._prepare_image, origin_image, prompt_mode, source=source, bbox=bbox, fitz_preprocess=fitz_preprocess
+            )
+            stats = {}
+            if self._is_hybrid(text_layer):
+                response = await self._ahybrid_response(
+                    origin_image, image, text_layer, stats, source=source, min_pixels=min_pixels, max_pixels=max_pixels,
+                    priority=priority, cancel_token=cancel_token,
+                )
+            else:
+                response = self._text_layer_response(text_layer, image, prompt_mode, stats, min_pixels=min_pixels, max_pixels=max_pixels)
+            if response is None:
+                max_completion_tokens, ink_tokens = await self._run_in_executor(
+                    self._token_budget, image, prompt, prompt_mode, min_pixels=min_pixels, max_pixels=max_pixels
+                )
+                response = await self._ainference(
+                    image, prompt, stats, max_completion_tokens=max_completion_tokens, priority=priority, cancel_token=cancel_token
+                )
+                self._observe_tokens(prompt_mode, ink_tokens, response, stats)
+        result = await self._run_in_executor(
+            self._post_process_result, response, origin_image, image, prompt_mode, save_dir, save_name,
+            source=source, page_idx=page_idx, min_pixels=min_pixels, max_pixels=max_pixels,
+        )
+        result.update(stats)
+        result['status'] = OK
+        return result
+
+    async def _agather_cancellable(self, coros, cancel_token=None, pbar=None):
+        """
+        Runs the coroutines of the pages of a document, returns their results in order and None for
+        the pages cancelled when `cancel_token` fired. Cancelling a task aborts its HTTP request.
+        """
+        loop = asyncio.get_running_loop()
+        tasks = [asyncio.ensure_future(coro) for coro in coros]
+
+        def _cancel_all():
+            for task in tasks:
+                task.cancel()
+
+        def _on_cancel():
+            loop.call_soon_threadsafe(_cancel_all)
+
+        if cancel_token is not None:
+            cancel_token.add_callback(_on_cancel)
+        try:
+            pending = set(tasks)
+            while pending:
+                # wake up at the deadline, an explicit cancel() goes through the callback
+                timeout = cancel_token.remaining() if cancel_token is not None else None
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if cancel_token is not None and cancel_token.cancelled:
+                    _cancel_all()
+                if pbar is not None:
+                    pbar.update(len(done))
+                    if self.limiter is not None:
+                        pbar.set_postfix(limit=self.limiter.limit)
+        except asyncio.CancelledError:
+            # the caller gave up on the whole document
+            _cancel_all()
+            raise
+        finally:
+            if cancel_token is not None:
+                cancel_token.remove_callback(_on_cancel)
+
+        results = []
+        for task in tasks:
+            if task.cancelled() or isinstance(task.exception(), ParseCancelled):
+                results.append(None)
+            else:
+                results.append(task.result())
+        return results
+
+    async def aparse_image(
+        self, input_path, filename, prompt_mode, save_dir, bbox=None, fitz_preprocess=False, priority=INTERACTIVE, cancel_token=None
+        ):
+        origin_image = await self._run_in_executor(fetch_image, input_path)
+        result, = await self._agather_cancellable([
+            self._aparse_single_image(
+                origin_image, prompt_mode, save_dir, filename, source="image", bbox=bbox, fitz_preprocess=fitz_preprocess,
+                priority=priority, cancel_token=cancel_token,
+            )
+        ], cancel_token)
+        if result is None:
+            result = self._cancelled_result(0, cancel_token.reason)
+        result['file_path'] = input_path
+        return [result]
+
+    async def aparse_pdf(self, input_path, filename, prompt_mode, save_dir, priority=BULK, cancel_token=None, pages=None):
+        print(f"loading pdf: {input_path}")
+        renderer = await self._run_in_executor(self._pdf_renderer, input_path)
+        try:
+            page_indices = parse_page_selection(pages, len(renderer))
+        except ValueError:
+            renderer.close()
+            raise
+        total_pages = len(page_indices)
+        # same bounded look-ahead as parse_pdf, a page renders once it holds a slot
+        slots = asyncio.Semaphore(self._max_concurrency() + self.render_ahead)
+        use_text_layer = self._uses_text_layer(prompt_mode)
+
+        async def _parse_page(i):
+            async with slots:
+                if cancel_token is not None:
+                    cancel_token.raise_if_cancelled()
+                image = await self._run_in_executor(renderer.render, i)
+                text_layer = await self._run_in_executor(renderer.analyze, i) if use_text_layer else None
+                return await self._aparse_single_image(
+                    image, prompt_mode, save_dir, filename, source="pdf", page_idx=i, priority=priority, cancel_token=cancel_token,
+                    text_layer=text_layer,
+                )
 
+        from tqdm import tqdm
+        try:
+            with tqdm(total=total_pages, desc="Processing PDF pages") as pbar:
+                results = await self._agather_cancellable([_parse_page(i) for i in page_indices], cancel_token, pbar=pbar)
+        finally:
+            renderer.close()
+        results = [
+            result if result is not None else self._cancelled_result(i, cancel_token.reason)
+            for i, result in zip(page_indices, results)
+        ]
+        for i in range(len(results)):
+            results[i]['file_path'] = input_path
         return results
 
+    async def aparse_file(self,
+        input_path,
+        output_dir="",
+        prompt_mode="prompt_layout_all_en",
+        bbox=None,
+        fitz_preprocess=False,
+        priority=None,
+        deadline=None,
+        cancel_token=None,
+        pages=None,
+        ):
+        """
+        Asyncio version of `parse_file`. Model calls go through AsyncOpenAI and are
+        bounded by `num_thread` in-flight requests per event loop, so many documents
+        can be parsed concurrently with `asyncio.gather`.
+        """
+        if deadline is not None:
+            cancel_token = CancellationToken(deadline=deadline, parent=cancel_token)
+        output_dir = output_dir or self.output_dir
+        output_dir = os.path.abspath(output_dir)
+        filename, file_ext = os.path.splitext(os.path.basename(input_path))
+        save_dir = os.path.join(output_dir, filename)
+        os.makedirs(save_dir, exist_ok=True)
+
+        start = time.perf_counter()
+        if file_ext == '.pdf':
+            results = await self.aparse_pdf(
+                input_path, filename, prompt_mode, save_dir, priority=priority or BULK, cancel_token=cancel_token, pages=pages,
+            )
+        elif file_ext in image_extensions:
+            results = await self.aparse_image(
+                input_path, filename, prompt_mode, save_dir, bbox=bbox, fitz_preprocess=fitz_preprocess,
+                priority=priority or INTERACTIVE, cancel_token=cancel_token,
+            )
+        else:
+            raise ValueError(f"file extension {file_ext} not supported, supported extensions are {image_extensions} and pdf")
+        summary = self._document_summary(input_path, results, time.perf_counter() - start)
+
+        print(f"Parsing finished, results saving to {save_dir}")
+        await self._run_in_executor(self._save_results_jsonl, output_dir, filename, results, summary=summary)
+        return results
 
 
 def main():
@@ -355,6 +1118,34 @@ def main():
         "--port", type=int, default=8000,
         help=""
     )
+    parser.add_argument(
+        "--endpoints", type=str, default=None,
+        help="comma separated vllm servers host:port,host:port,... to load balance over, overrides --ip/--port"
+    )
+    parser.add_argument(
+        "--endpoint_concurrency", type=int, default=None,
+        help="max in-flight requests per endpoint (default: num_thread)"
+    )
+    parser.add_argument(
+        "--max_retries", type=int, default=3,
+        help="retries with jittered exponential backoff for transient request errors (timeouts, 5xx, 429)"
+    )
+    parser.add_argument(
+        "--request_timeout", type=float, default=None,
+        help="per-request timeout in seconds"
+    )
+    parser.add_argument(
+        "--hedge", action='store_true',
+        help="send a duplicate request to another endpoint when a page takes longer than the p95 latency"
+    )
+    parser.add_argument(
+        "--cache_dir", type=str, default=None,
+        help="directory of an on-disk response cache keyed by page image, prompt and sampling params"
+    )
+    parser.add_argument(
+        "--cache_max_bytes", type=int, default=1 << 30,
+        help="size bound of the response cache, least recently used entries are evicted"
+    )
     parser.add_argument(
         "--model_name", type=str, default="model",
         help=""
@@ -375,6 +1166,34 @@ def main():
         "--max_completion_tokens", type=int, default=16384,
         help=""
     )
+    parser.add_argument(
+        "--max_model_len", type=int, default=MAX_MODEL_LEN,
+        help="context length of the served model, caps the output budget next to the image tokens"
+    )
+    parser.add_argument(
+        "--adaptive_max_tokens", action='store_true',
+        help="size the output budget of each page from its ink density, learned from the pages already parsed"
+    )
+    parser.add_argument(
+        "--adaptive_concurrency", action='store_true',
+        help="adapt the number of in-flight requests (AIMD) to the server latency, num_thread is the upper bound"
+    )
+    parser.add_argument(
+        "--pages", type=str, default=None,
+        help="pdf pages to parse, 1-based and inclusive, e.g. 1-5,9,12- ; all pages by default"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=None,
+        help="wall-clock budget of the job in seconds, pages not parsed by then are skipped and reported in the jsonl"
+    )
+    parser.add_argument(
+        "--priority", choices=[INTERACTIVE, BULK], type=str, default=None,
+        help="scheduling class of the requests, defaults to interactive for images and bulk for pdfs"
+    )
+    parser.add_argument(
+        "--no_coalesce", action='store_true',
+        help="send identical pages that are in flight at the same time as separate requests"
+    )
     parser.add_argument(
         "--num_thread", type=int, default=16,
         help=""
@@ -383,6 +1202,35 @@ def main():
         "--no_fitz_preprocess", action='store_true',
         help="False will use tikz dpi upsample pipeline, good for images which has been render with low dpi, but maybe result in higher computational costs"
     )
+    parser.add_argument(
+        "--image_format", choices=['PNG', 'JPEG', 'WEBP'], type=str, default='PNG',
+        help="codec of the page images sent to the server"
+    )
+    parser.add_argument(
+        "--image_quality", type=int, default=None,
+        help="JPEG/WEBP quality"
+    )
+    parser.add_argument(
+        "--png_compress_level", type=int, default=None,
+        help="PNG zlib level 0-9, lower encodes faster but sends more bytes"
+    )
+    parser.add_argument(
+        "--reduce_colors", action='store_true',
+        help="losslessly send grayscale and few-color pages as gray/palette PNG"
+    )
+    parser.add_argument(
+        "--render_ahead", type=int, default=8,
+        help="pdf pages rendered ahead of the ones being parsed, bounds the memory of large pdfs"
+    )
+    parser.add_argument(
+        "--pdf_parse_method", choices=['ocr', 'auto', 'hybrid'], type=str, default='ocr',
+        help="auto reads born-digital pdf pages from their text layer, only scanned pages go to the model; "
+             "hybrid detects the layout with the model and fills in the text from the text layer (prompt_layout_all_en only)"
+    )
+    parser.add_argument(
+        "--render_workers", type=int, default=0,
+        help="processes rasterising pdf pages in parallel, 0 renders in the parsing process"
+    )
     parser.add_argument(
         "--min_pixels", type=int, default=None,
         help=""
@@ -395,33 +1243,124 @@ def main():
         "--use_hf", type=bool, default=False,
         help=""
     )
+    parser.add_argument(
+        "--hf_model_path", type=str, default="./weights/DotsOCR",
+        help="weights directory of the hf backend"
+    )
+    parser.add_argument(
+        "--hf_profile", choices=['gpu', 'cpu'], type=str, default='gpu',
+        help="hf loading preset, cpu uses sdpa attention and int8 dynamic quantization of the linear layers"
+    )
+    parser.add_argument(
+        "--hf_quantization", choices=['none', 'int8'], type=str, default=None,
+        help="override the quantization of the hf profile, none keeps the cpu profile in float32"
+    )
+    parser.add_argument(
+        "--hf_num_threads", type=int, default=None,
+        help="torch intra-op threads of the hf backend, defaults to the torch default"
+    )
+    parser.add_argument(
+        "--hf_batch_size", type=int, default=8,
+        help="pages per generate call of the hf backend, 1 to run pages one by one"
+    )
+    parser.add_argument(
+        "--hf_batch_wait_ms", type=int, default=20,
+        help="how long the hf backend waits for more pages before starting a batch"
+    )
+    parser.add_argument(
+        "--backend", choices=['vllm', 'hf', 'fake'], type=str, default=None,
+        help="inference backend, defaults to vllm (or hf with --use_hf); fake replays recorded responses without a model"
+    )
+    parser.add_argument(
+        "--fake_responses", type=str, default=None,
+        help=".jsonl of recorded responses replayed by the fake backend"
+    )
+    parser.add_argument(
+        "--fake_latency", type=float, default=1.0,
+        help="mean latency in seconds of the fake backend"
+    )
+    parser.add_argument(
+        "--fake_latency_distribution", choices=['constant', 'uniform', 'exponential', 'lognormal'], type=str, default='lognormal',
+        help="latency distribution of the fake backend"
+    )
+    parser.add_argument(
+        "--stream", action='store_true',
+        help="stream the response and print each layout cell as a json line as soon as it is complete, image input only"
+    )
     args = parser.parse_args()
 
+    backend = None
+    if args.backend == 'fake':
+        backend = FakeBackend(
+            responses=args.fake_responses,
+            latency=args.fake_latency,
+            distribution=args.fake_latency_distribution,
+        )
+
     dots_ocr_parser = DotsOCRParser(
         ip=args.ip,
         port=args.port,
+        endpoints=args.endpoints,
+        endpoint_concurrency=args.endpoint_concurrency,
+        max_retries=args.max_retries,
+        request_timeout=args.request_timeout,
+        hedge=args.hedge,
+        cache_dir=args.cache_dir,
+        cache_max_bytes=args.cache_max_bytes,
         model_name=args.model_name,
         temperature=args.temperature,
         top_p=args.top_p,
         max_completion_tokens=args.max_completion_tokens,
+        max_model_len=args.max_model_len,
+        adaptive_max_tokens=args.adaptive_max_tokens,
         num_thread=args.num_thread,
+        adaptive_concurrency=args.adaptive_concurrency,
+        coalesce_requests=not args.no_coalesce,
         dpi=args.dpi,
+        render_ahead=args.render_ahead,
+        render_workers=args.render_workers,
+        pdf_parse_method=args.pdf_parse_method,
         output_dir=args.output, 
         min_pixels=args.min_pixels,
         max_pixels=args.max_pixels,
-        use_hf=args.use_hf,
+        use_hf=args.use_hf or args.backend == 'hf',
+        hf_max_batch_size=args.hf_batch_size,
+        hf_max_wait_ms=args.hf_batch_wait_ms,
+        hf_model_path=args.hf_model_path,
+        hf_profile=args.hf_profile,
+        hf_num_threads=args.hf_num_threads,
+        hf_quantization=args.hf_quantization,
+        backend=backend,
+        image_encoding=ImageEncodePolicy(
+            format=args.image_format,
+            quality=args.image_quality,
+            compress_level=args.png_compress_level,
+            reduce_colors=args.reduce_colors,
+        ),
     )
 
     fitz_preprocess = not args.no_fitz_preprocess
     if fitz_preprocess:
         print(f"Using fitz preprocess for image input, check the change of the image pixels")
-    result = dots_ocr_parser.parse_file(
-        args.input_path, 
-        prompt_mode=args.prompt,
-        bbox=args.bbox,
-        fitz_preprocess=fitz_preprocess,
-        )
-    
+    with dots_ocr_parser:
+        if args.stream:
+            for cell in dots_ocr_parser.parse_file_stream(
+                args.input_path,
+                prompt_mode=args.prompt,
+                bbox=args.bbox,
+                fitz_preprocess=fitz_preprocess,
+                ):
+                print(json.dumps(cell, ensure_ascii=False), flush=True)
+            return
+        result = dots_ocr_parser.parse_file(
+            args.input_path, 
+            prompt_mode=args.prompt,
+            bbox=args.bbox,
+            fitz_preprocess=fitz_preprocess,
+            priority=args.priority,
+            deadline=time.time() + args.timeout if args.timeout else None,
+            pages=args.pages,
+            )
 
 
 if __name__ == "__main__":
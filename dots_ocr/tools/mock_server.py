@@ -0,0 +1,260 @@
+"""
+OpenAI-compatible stand-in for a vLLM server, for client-side load and regression benchmarks
+without a GPU.
+
+`/v1/chat/completions` answers in blocking and streaming (server-sent events) form with canned
+layout JSON. The response delay models the server: `base_latency` plus a prefill cost per image
+token (computed with the same smart resize as the model) plus a decode cost per output token.
+
+    python -m dots_ocr.tools.mock_server --port 8000 --decode_ms_per_token 5
+    python dots_ocr/parser.py demo/demo_pdf1.pdf --port 8000
+"""
+import io
+import json
+import time
+import base64
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+from dots_ocr.model.backends import DEFAULT_FAKE_RESPONSE, load_recorded_responses
+from dots_ocr.model.token_budget import count_image_tokens
+
+
+class MockVLLMServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server holding the simulation settings, see `start_mock_server`.
+
+    Args:
+        address: (host, port) to listen on, port 0 picks a free one.
+        responses: Canned responses, picked per request from a hash of the image.
+        model_name: Model id served under `/v1/models`.
+        base_latency: Fixed seconds per request.
+        prefill_ms_per_token: Milliseconds per image token before the first output token.
+        decode_ms_per_token: Milliseconds per output token.
+        chars_per_token: Characters of response text counted as one output token.
+        max_num_seqs: Requests served at once, the others wait in a queue like in vLLM.
+            None for no limit.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address=("127.0.0.1", 8000),
+        responses=None,
+        model_name="model",
+        base_latency=0.02,
+        prefill_ms_per_token=0.05,
+        decode_ms_per_token=5.0,
+        chars_per_token=3,
+        max_num_seqs=None,
+    ):
+        super().__init__(address, MockVLLMHandler)
+        self.responses = responses or [DEFAULT_FAKE_RESPONSE]
+        self.model_name = model_name
+        self.base_latency = base_latency
+        self.prefill_ms_per_token = prefill_ms_per_token
+        self.decode_ms_per_token = decode_ms_per_token
+        self.chars_per_token = chars_per_token
+        self._slots = threading.Semaphore(max_num_seqs) if max_num_seqs else None
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def plan(self, body):
+        """
+        Returns (text, image_tokens, prompt_tokens, completion_tokens, finish_reason) of a chat
+        completion request. prompt_tokens counts the image tokens and about one token per four
+        characters of prompt text, whatever the codec of the image.
+        """
+        image_bytes, text = b"", ""
+        for message in body.get("messages", []):
+            content = message.get("content")
+            if isinstance(content, str):
+                text += content
+                continue
+            for part in content or []:
+                if part.get("type") == "image_url":
+                    url = part["image_url"]["url"]
+                    image_bytes += base64.b64decode(url.split(",", 1)[-1])
+                elif part.get("type") == "text":
+                    text += part["text"]
+
+        image_tokens = 0
+        if image_bytes:
+            # only the header is decoded to get the size
+            width, height = Image.open(io.BytesIO(image_bytes)).size
+            image_tokens = count_image_tokens(height, width)
+        key = int(hashlib.sha1(image_bytes + text.encode("utf-8")).hexdigest(), 16)
+        response = self.responses[key % len(self.responses)]
+
+        max_tokens = body.get("max_completion_tokens") or body.get("max_tokens")
+        completion_tokens = max(1, -(-len(response) // self.chars_per_token))
+        finish_reason = "stop"
+        if max_tokens is not None and completion_tokens > max_tokens:
+            response = response[:max_tokens * self.chars_per_token]
+            completion_tokens, finish_reason = max_tokens, "length"
+        prompt_tokens = image_tokens + len(text) // 4
+        return response, image_tokens, prompt_tokens, completion_tokens, finish_reason
+
+    def prefill_delay(self, image_tokens):
+        return self.base_latency + image_tokens * self.prefill_ms_per_token / 1000
+
+
+class MockVLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like vLLM's uvicorn server
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/v1/models":
+            self._send_json(200, {"object": "list", "data": [{"id": self.server.model_name, "object": "model"}]})
+        elif self.path.rstrip("/") == "/health":
+            self._send_json(200, {})
+        else:
+            self._send_json(404, {"error": {"message": f"not found: {self.path}"}})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path.rstrip("/") != "/v1/chat/completions":
+            self._send_json(404, {"error": {"message": f"not found: {self.path}"}})
+            return
+        server = self.server
+        with server._lock:
+            server.requests += 1
+        response, image_tokens, prompt_tokens, completion_tokens, finish_reason = server.plan(body)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        if server._slots is not None:
+            server._slots.acquire()
+        try:
+            self._respond(body, response, image_tokens, completion_tokens, finish_reason, usage)
+        except (BrokenPipeError, ConnectionResetError):
+            # the client went away, vLLM aborts the request in that case
+            self.close_connection = True
+        finally:
+            if server._slots is not None:
+                server._slots.release()
+
+    def _respond(self, body, response, image_tokens, completion_tokens, finish_reason, usage):
+        server = self.server
+        time.sleep(server.prefill_delay(image_tokens))
+        if body.get("stream"):
+            include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+            self._stream(body, response, completion_tokens, finish_reason, usage if include_usage else None)
+            return
+        time.sleep(completion_tokens * server.decode_ms_per_token / 1000)
+        self._send_json(200, {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", server.model_name),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": response},
+                "finish_reason": finish_reason,
+            }],
+            "usage": usage,
+        })
+
+    def _stream(self, body, response, completion_tokens, finish_reason, usage):
+        server = self.server
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def _event(payload):
+            data = f"data: {payload}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        def _chunk(delta, finish=None, chunk_usage=None):
+            payload = {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", server.model_name),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}] if delta is not None else [],
+            }
+            if chunk_usage is not None:
+                payload["usage"] = chunk_usage
+            _event(json.dumps(payload))
+
+        step = server.chars_per_token
+        _chunk({"role": "assistant", "content": ""})
+        for i in range(0, len(response), step):
+            time.sleep(server.decode_ms_per_token / 1000)
+            _chunk({"content": response[i:i + step]})
+        _chunk({}, finish=finish_reason)
+        if usage is not None:
+            _chunk(None, chunk_usage=usage)
+        _event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+def start_mock_server(host="127.0.0.1", port=0, **kwargs):
+    """
+    Starts a MockVLLMServer in a background thread and returns it, `server.port` is the bound port.
+    """
+    server = MockVLLMServer((host, port), **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible mock vLLM server for dots.ocr benchmarks")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--model_name", type=str, default="model")
+    parser.add_argument(
+        "--responses", type=str, default=None,
+        help=".jsonl file of recorded responses to replay, defaults to a small canned layout"
+    )
+    parser.add_argument("--base_latency", type=float, default=0.02, help="seconds added to every request")
+    parser.add_argument("--prefill_ms_per_token", type=float, default=0.05, help="milliseconds per image token")
+    parser.add_argument("--decode_ms_per_token", type=float, default=5.0, help="milliseconds per output token")
+    parser.add_argument("--max_num_seqs", type=int, default=None, help="requests served at once, the rest queue")
+    args = parser.parse_args()
+
+    server = MockVLLMServer(
+        (args.host, args.port),
+        responses=load_recorded_responses(args.responses) if args.responses else None,
+        model_name=args.model_name,
+        base_latency=args.base_latency,
+        prefill_ms_per_token=args.prefill_ms_per_token,
+        decode_ms_per_token=args.decode_ms_per_token,
+        max_num_seqs=args.max_num_seqs,
+    )
+    print(f"mock vLLM server listening on http://{args.host}:{server.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
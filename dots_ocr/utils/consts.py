@@ -1,5 +1,10 @@
 MIN_PIXELS=3136
 MAX_PIXELS=11289600
+# default cap of the cpu profile of the hf backend, every 28x28 pixels become one vision token
+CPU_MAX_PIXELS=1280*28*28
 IMAGE_FACTOR=28
 
 image_extensions = {'.jpg', '.jpeg', '.png'}
+
+MAX_MODEL_LEN=131072  # context length of the model, prompt + image tokens + output
+MIN_COMPLETION_TOKENS=256
@@ -1,20 +1,93 @@
-import fitz
-import numpy as np
+import os
 import enum
-from pydantic import BaseModel, Field
+import threading
 from PIL import Image
 
 
 class SupportedPdfParseMethod(enum.Enum):
     OCR = 'ocr'
     TXT = 'txt'
+    HYBRID = 'hybrid'  # layout from the model, text from the text layer
 
 
-class PageInfo(BaseModel):
-    """The width and height of page
+def _page_info_model():
+    # pydantic is only needed by callers of PageInfo, so the model is built on first access
+    from pydantic import BaseModel, Field
+
+    class PageInfo(BaseModel):
+        """The width and height of page
+        """
+        w: float = Field(description='the width of page')
+        h: float = Field(description='the height of page')
+
+    return PageInfo
+
+
+def __getattr__(name):
+    if name == "PageInfo":
+        globals()["PageInfo"] = _page_info_model()
+        return globals()["PageInfo"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def parse_page_selection(pages, num_pages):
+    """Resolve a page selection like "1-5,9,12-" against a document of `num_pages` pages.
+
+    Page numbers are 1-based and ranges inclusive, "12-" runs to the last page and "-3" starts
+    at the first one. Pages past the end of the document are dropped.
+
+    Args:
+        pages (str): comma separated page numbers and ranges, None or "" for every page.
+        num_pages (int): page count of the document.
+
+    Returns:
+        list: sorted, de-duplicated 0-based page indices
+    """
+    if not pages:
+        return list(range(num_pages))
+    selected = set()
+    for part in pages.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        first, dash, last = part.partition('-')
+        first, last = first.strip(), last.strip()
+        if not (first or last) or not all(x.isdigit() for x in (first, last) if x):
+            raise ValueError(f"invalid page selection {part!r} in {pages!r}, expected e.g. 1-5,9,12-")
+        start = int(first) if first else 1
+        end = int(last) if last else (num_pages if dash else start)
+        if start < 1 or (last and end < start):
+            raise ValueError(f"invalid page range {part!r} in {pages!r}, pages start at 1 and ranges run upwards")
+        selected.update(range(start - 1, min(end, num_pages)))
+    if not selected:
+        print(f"page selection {pages!r} matches none of the {num_pages} pages")
+    return sorted(selected)
+
+
+def render_pixmap(page, target_dpi=200):
+    """Render a fitz page to raw RGB bytes.
+
+    Args:
+        page: pymupdf page.
+        target_dpi (int, optional): dpi to render at, pages over 4500 px fall back to 72 dpi. Defaults to 200.
+
+    Returns:
+        tuple: (width, height, bytes of the RGB pixels)
     """
-    w: float = Field(description='the width of page')
-    h: float = Field(description='the height of page')
+    import fitz
+    mat = fitz.Matrix(target_dpi / 72, target_dpi / 72)
+    pm = page.get_pixmap(matrix=mat, alpha=False)
+
+    if pm.width > 4500 or pm.height > 4500:
+        mat = fitz.Matrix(72 / 72, 72 / 72)  # use fitz default dpi
+        pm = page.get_pixmap(matrix=mat, alpha=False)
+
+    return pm.width, pm.height, pm.samples
+
+
+def pixmap_to_image(pixmap):
+    width, height, samples = pixmap
+    return Image.frombytes('RGB', (width, height), samples)
 
 
 def fitz_doc_to_image(doc, target_dpi=200, origin_dpi=None) -> dict:
@@ -27,19 +100,58 @@ def fitz_doc_to_image(doc, target_dpi=200, origin_dpi=None) -> dict:
     Returns:
         dict:  {'img': numpy array, 'width': width, 'height': height }
     """
-    from PIL import Image
-    mat = fitz.Matrix(target_dpi / 72, target_dpi / 72)
-    pm = doc.get_pixmap(matrix=mat, alpha=False)
+    return pixmap_to_image(render_pixmap(doc, target_dpi=target_dpi))
 
-    if pm.width > 4500 or pm.height > 4500:
-        mat = fitz.Matrix(72 / 72, 72 / 72)  # use fitz default dpi
-        pm = doc.get_pixmap(matrix=mat, alpha=False)
 
-    image = Image.frombytes('RGB', (pm.width, pm.height), pm.samples)
-    return image
+# (pdf_file, mtime, document) opened by a render worker process, reused by its following tasks
+_worker_doc = None
 
 
-def load_images_from_pdf(pdf_file, dpi=200, start_page_id=0, end_page_id=None) -> list:
+def _render_pages_in_worker(pdf_file, dpi, start, end):
+    """Renders pages [start, end) of `pdf_file` inside a render worker process.
+
+    Every worker opens the pdf itself and keeps it open for the next task on the same file.
+    Pages travel back as raw pixmap bytes, which pickle as a plain copy.
+
+    Returns:
+        list: (width, height, bytes) per page
+    """
+    global _worker_doc
+    import fitz
+    mtime = os.path.getmtime(pdf_file)
+    if _worker_doc is None or _worker_doc[:2] != (pdf_file, mtime):
+        if _worker_doc is not None:
+            _worker_doc[2].close()
+        _worker_doc = (pdf_file, mtime, fitz.open(pdf_file))
+    doc = _worker_doc[2]
+    return [render_pixmap(doc[index], target_dpi=dpi) for index in range(start, end)]
+
+
+def new_render_pool(num_workers):
+    """Process pool for rendering pdf pages in parallel, see PdfPageRenderer.
+
+    Workers are spawned rather than forked, the parent usually runs request threads.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    return ProcessPoolExecutor(max_workers=num_workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def load_images_from_pdf(pdf_file, dpi=200, start_page_id=0, end_page_id=None, num_workers=0) -> list:
+    """Render a range of pages of a pdf.
+
+    Args:
+        pdf_file (str): path of the pdf.
+        dpi (int, optional): target dpi. Defaults to 200.
+        start_page_id (int, optional): first page, 0-based. Defaults to 0.
+        end_page_id (int, optional): last page included, None for the last page of the document.
+        num_workers (int, optional): with more than 1, the range is split into one contiguous
+            chunk per worker process. Defaults to 0, rendering in the calling thread.
+
+    Returns:
+        list: PIL images of the pages
+    """
+    import fitz
     images = []
     with fitz.open(pdf_file) as doc:
         pdf_page_num = doc.page_count
@@ -52,9 +164,89 @@ def load_images_from_pdf(pdf_file, dpi=200, start_page_id=0, end_page_id=None) -
             print('end_page_id is out of range, use images length')
             end_page_id = pdf_page_num - 1
 
-        for index in range(0, doc.page_count):
-            if start_page_id <= index <= end_page_id:
-                page = doc[index]
-                img = fitz_doc_to_image(page, target_dpi=dpi)
-                images.append(img)
-    return images
\ No newline at end of file
+        if num_workers <= 1:
+            for index in range(0, doc.page_count):
+                if start_page_id <= index <= end_page_id:
+                    page = doc[index]
+                    img = fitz_doc_to_image(page, target_dpi=dpi)
+                    images.append(img)
+            return images
+
+    num_pages = max(0, end_page_id - start_page_id + 1)
+    chunk = -(-num_pages // num_workers) if num_pages else 1
+    with new_render_pool(num_workers) as pool:
+        futures = [
+            pool.submit(_render_pages_in_worker, pdf_file, dpi, start, min(start + chunk, end_page_id + 1))
+            for start in range(start_page_id, end_page_id + 1, chunk)
+        ]
+        for future in futures:
+            images.extend(pixmap_to_image(pixmap) for pixmap in future.result())
+    return images
+
+
+class _RenderedPage:
+    """Result of PdfPageRenderer.submit, `result()` returns the PIL image of the page."""
+
+    def __init__(self, render=None, future=None):
+        self._render = render
+        self._future = future
+
+    def result(self):
+        if self._future is None:
+            return self._render()
+        pixmap, = self._future.result()
+        return pixmap_to_image(pixmap)
+
+
+class PdfPageRenderer:
+    """Renders the pages of a pdf one at a time, so that callers only hold the pages they work on.
+
+    Without a `pool` the document is opened once in this process; fitz documents are not
+    thread-safe, so renders are serialised and a submitted page is only rendered when its
+    result is asked for. With a `pool` (see new_render_pool) pages render in the worker
+    processes as soon as they are submitted.
+
+    Args:
+        pdf_file (str): path of the pdf.
+        dpi (int, optional): target dpi of the rendered pages. Defaults to 200.
+        pool (ProcessPoolExecutor, optional): render worker processes. Defaults to None.
+    """
+
+    def __init__(self, pdf_file, dpi=200, pool=None):
+        import fitz
+        self.pdf_file = os.path.abspath(pdf_file)
+        self.doc = fitz.open(pdf_file)
+        self.dpi = dpi
+        self.pool = pool
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.doc.page_count
+
+    def _render_here(self, index):
+        with self._lock:
+            return fitz_doc_to_image(self.doc[index], target_dpi=self.dpi)
+
+    def submit(self, index):
+        if self.pool is None:
+            return _RenderedPage(render=lambda: self._render_here(index))
+        return _RenderedPage(future=self.pool.submit(_render_pages_in_worker, self.pdf_file, self.dpi, index, index + 1))
+
+    def render(self, index):
+        return self.submit(index).result()
+
+    def analyze(self, index):
+        """Text layer of a page and whether it can replace the model, see text_layer.analyze_page."""
+        from dots_ocr.utils.text_layer import analyze_page
+        with self._lock:
+            return analyze_page(self.doc[index])
+
+    def close(self):
+        with self._lock:
+            self.doc.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,13 +1,11 @@
 import math
 import base64
-from PIL import Image
+from PIL import Image, ImageChops
 from typing import Tuple
 import os
 from dots_ocr.utils.consts import IMAGE_FACTOR, MIN_PIXELS, MAX_PIXELS
 from dots_ocr.utils.doc_utils import fitz_doc_to_image
 from io import BytesIO
-import fitz
-import requests
 import copy
 
 
@@ -64,13 +62,81 @@ def smart_resize(
 
 
 
-def PILimage_to_base64(image, format='PNG'):
+def PILimage_to_base64(image, format='PNG', quality=None, compress_level=None):
     buffered = BytesIO()
-    image.save(buffered, format=format)
+    save_kwargs = {}
+    if quality is not None and format.upper() in ('JPEG', 'WEBP'):
+        save_kwargs['quality'] = quality
+    if compress_level is not None and format.upper() == 'PNG':
+        save_kwargs['compress_level'] = compress_level
+    image.save(buffered, format=format, **save_kwargs)
     base64_str = base64.b64encode(buffered.getvalue()).decode('utf-8')
     return f"data:image/{format.lower()};base64,{base64_str}"
 
 
+def reduce_image_colors(image: Image.Image) -> Image.Image:
+    """
+    Losslessly shrinks the pixel format of an RGB image: exact grayscale becomes 'L' and
+    images with at most 256 distinct colors become a palette image, which PNG stores at
+    1/2/4/8 bits per pixel. Monochrome scans shrink by several times this way. Every pixel
+    maps back to exactly its original color.
+    """
+    if image.mode != 'RGB':
+        return image
+    r, g, b = image.split()
+    if ImageChops.difference(r, g).getbbox() is None and ImageChops.difference(g, b).getbbox() is None:
+        image = r
+    colors = image.getcolors(maxcolors=256)
+    if colors is None or image.mode == 'L' and len(colors) > 16:
+        return image  # too many colors for a smaller palette, 'L' already is 8 bits
+    palette = []
+    for _, color in colors:
+        palette.extend((color, color, color) if image.mode == 'L' else color)
+    if image.mode == 'L':
+        lookup = {color: index for index, (_, color) in enumerate(colors)}
+        indexed = image.point([lookup.get(value, 0) for value in range(256)])
+        indexed.putpalette(palette)
+        return indexed
+    # exact color -> index mapping, Image.quantize matches colors at reduced precision
+    import numpy as np
+    pixels = np.asarray(image)
+    packed = (pixels[..., 0].astype(np.uint32) << 16) | (pixels[..., 1].astype(np.uint32) << 8) | pixels[..., 2]
+    keys = np.array([(r << 16) | (g << 8) | b for _, (r, g, b) in colors], dtype=np.uint32)
+    order = np.argsort(keys)
+    indices = order[np.searchsorted(keys[order], packed)].astype(np.uint8)
+    indexed = Image.fromarray(indices, mode='L').convert('P')
+    indexed.putpalette(palette)
+    return indexed
+
+
+class ImageEncodePolicy:
+    """
+    How page images are encoded for the request payload.
+
+    Args:
+        format: 'PNG' (lossless, default), 'JPEG' or 'WEBP'.
+        quality: Quality for JPEG/WEBP, ignored for PNG.
+        compress_level: zlib level 0-9 for PNG, lower is faster and larger. None keeps the PIL default.
+        reduce_colors: Losslessly store grayscale or few-color pages as 'L'/palette images, PNG only.
+    """
+
+    def __init__(self, format='PNG', quality=None, compress_level=None, reduce_colors=False):
+        self.format = format.upper()
+        assert self.format in ('PNG', 'JPEG', 'WEBP'), f"unsupported image format {format}"
+        self.quality = quality
+        self.compress_level = compress_level
+        self.reduce_colors = reduce_colors
+
+    def __repr__(self):
+        return (f"ImageEncodePolicy(format={self.format}, quality={self.quality}, "
+                f"compress_level={self.compress_level}, reduce_colors={self.reduce_colors})")
+
+    def encode(self, image: Image.Image) -> str:
+        if self.reduce_colors and self.format == 'PNG':
+            image = reduce_image_colors(image)
+        return PILimage_to_base64(image, format=self.format, quality=self.quality, compress_level=self.compress_level)
+
+
 def to_rgb(pil_image: Image.Image) -> Image.Image:
     if pil_image.mode == 'RGBA':
         white_background = Image.new("RGB", pil_image.size, (255, 255, 255))
@@ -93,6 +159,7 @@ def fetch_image(
     if isinstance(image, Image.Image):
         image_obj = image
     elif image.startswith("http://") or image.startswith("https://"):
+        import requests
         # fix memory leak issue while using BytesIO
         with requests.get(image, stream=True) as response:
             response.raise_for_status()
@@ -169,12 +236,14 @@ def get_input_dimensions(
 
 def get_image_by_fitz_doc(image, target_dpi=200):
     # get image through fitz, to get target dpi image, mainly for higher image
+    import fitz
     if not isinstance(image, Image.Image):
         assert isinstance(image, str)
         _, file_ext = os.path.splitext(image)
         assert file_ext in {'.jpg', '.jpeg', '.png'}
 
         if image.startswith("http://") or image.startswith("https://"):
+            import requests
             with requests.get(image, stream=True) as response:
                 response.raise_for_status()
                 data_bytes = response.content
@@ -1,7 +1,6 @@
 from PIL import Image
 from typing import Dict, List
 
-import fitz
 from io import BytesIO
 import json
 
@@ -46,6 +45,7 @@ def draw_layout_on_image(image, cells, resized_height=None, resized_width=None,
     # origin_image = Image.open(image_path)
     original_width, original_height = image.size
         
+    import fitz
     # Create a new PDF document
     doc = fitz.open()
     
@@ -226,3 +226,63 @@ def post_process_output(response, prompt_mode, origin_image, input_image, min_pi
         if isinstance(response_clean, list):
             response_clean = "\n\n".join([cell['text'] for cell in response_clean if 'text' in cell])
         return response_clean, True
+
+
+class IncrementalLayoutParser:
+    """
+    Tolerant incremental parser for the layout JSON streamed by the model.
+
+    Text chunks are fed as they arrive; every `{...}` object that closes directly inside a
+    list (or at the top level) and carries a `bbox` is returned as soon as its closing
+    brace is seen. Objects that fail to parse are skipped, the complete response is still
+    available through `text` for the regular `post_process_output` pass.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._text = ""
+        self._pos = 0
+        self._stack = []  # (bracket, start offset)
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def text(self):
+        if self._chunks:
+            self._text += "".join(self._chunks)
+            self._chunks = []
+        return self._text
+
+    def feed(self, chunk):
+        """
+        Consumes a chunk of model output and returns the list of cells completed by it.
+        """
+        if not chunk:
+            return []
+        self._chunks.append(chunk)
+        text = self.text
+        cells = []
+        for pos in range(self._pos, len(text)):
+            char = text[pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in '{[':
+                self._stack.append((char, pos))
+            elif char in '}]' and self._stack:
+                bracket, start = self._stack.pop()
+                if char == '}' and bracket == '{' and (not self._stack or self._stack[-1][0] == '['):
+                    try:
+                        cell = json.loads(text[start:pos + 1])
+                    except ValueError:
+                        continue
+                    if isinstance(cell, dict) and 'bbox' in cell:
+                        cells.append(cell)
+        self._pos = len(text)
+        return cells
@@ -32,3 +32,12 @@ dict_promptmode_to_prompt = {
     # "prompt_table_latex": """Convert the table in this image to LaTeX.""",
     # "prompt_formula_latex": """Convert the formula in this image to LaTeX.""",
 }
+
+
+# output token budget per prompt mode, further capped by the context left after the image tokens
+dict_promptmode_to_max_tokens = {
+    "prompt_layout_all_en": 16384,
+    "prompt_layout_only_en": 8192,  # bboxes and categories only, no text
+    "prompt_ocr": 16384,
+    "prompt_grounding_ocr": 8192,  # text of a single region
+}
@@ -0,0 +1,265 @@
+import re
+import json
+
+from dots_ocr.utils.doc_utils import SupportedPdfParseMethod
+
+
+# prompt modes a page's text layer can answer in place of the model
+TEXT_LAYER_PROMPT_MODES = ("prompt_layout_all_en", "prompt_layout_only_en", "prompt_ocr")
+
+# fonts of TeX and office math, their glyphs only make sense as LaTeX from the model
+MATH_FONT = re.compile(r"CMMI|CMSY|CMEX|CMBSY|MSAM|MSBM|Math|Symbol|STIX|esint|rsfs", re.IGNORECASE)
+LIST_MARKER = re.compile(r"^\s*([•◦▪▫●○■□‣⁃\-\*–]|\(?\d{1,3}[\.\)]|\(?[a-zA-Z][\.\)])\s+")
+BULLET = re.compile(r"^\s*[•◦▪▫●○■□‣⁃–]\s*")
+CAPTION = re.compile(r"^\s*(Figure|Fig\.|Table|Tab\.|Chart|Algorithm|图|表)\s*[\dA-Z]", re.IGNORECASE)
+
+# layout regions the text layer cannot give in the model's format (LaTeX, HTML), read by the model instead
+GROUNDING_CATEGORIES = ("Formula", "Table")
+
+
+def _span_chars(span):
+    return len(span["text"].strip())
+
+
+def _image_coverage(page):
+    page_rect = page.rect
+    area = 0.0
+    for info in page.get_image_info():
+        bbox = page_rect & info["bbox"]
+        if not bbox.is_empty:
+            area += bbox.width * bbox.height
+    return min(1.0, area / max(page_rect.width * page_rect.height, 1.0))
+
+
+def _ruling_lines(page, limit):
+    """Counts axis-aligned strokes and thin rectangles, the rulings of tables, up to `limit`."""
+    count = 0
+    for path in page.get_drawings():
+        for item in path["items"]:
+            if item[0] == "l":
+                p1, p2 = item[1], item[2]
+                count += abs(p1.x - p2.x) < 1 or abs(p1.y - p2.y) < 1
+            elif item[0] == "re":
+                rect = item[1]
+                count += min(rect.width, rect.height) < 2
+            if count >= limit:
+                return count
+    return count
+
+
+def _join_lines(lines):
+    """Lines joined with spaces, words hyphenated across a line break joined back together."""
+    text = ""
+    for line_text in lines:
+        line_text = line_text.strip()
+        if not line_text:
+            continue
+        if text.endswith("-") and line_text[:1].islower():
+            text = text[:-1] + line_text
+        else:
+            text = f"{text} {line_text}" if text else line_text
+    return text
+
+
+def _block_text(block):
+    return _join_lines("".join(span["text"] for span in line["spans"]) for line in block["lines"])
+
+
+def _format_text(category, text):
+    # markdown the model writes for the category
+    if category == "Title":
+        return f"# {text}"
+    if category == "Section-header":
+        return f"## {text}"
+    if category == "List-item":
+        return BULLET.sub("- ", text, count=1)
+    return text
+
+
+def _categorize(blocks, page_width, page_height):
+    """
+    Layout category of each text block from font size, position and leading markers,
+    the cheap counterpart of the model's layout detection.
+    """
+    sizes = []
+    for block in blocks:
+        for line in block["lines"]:
+            for span in line["spans"]:
+                sizes.extend([span["size"]] * _span_chars(span))
+    body_size = sorted(sizes)[len(sizes) // 2] if sizes else 10.0
+    max_size = max(sizes) if sizes else body_size
+
+    cells = []
+    title_seen = False
+    for block in blocks:
+        text = _block_text(block)
+        if not text:
+            continue
+        x0, y0, x1, y1 = block["bbox"]
+        spans = [span for line in block["lines"] for span in line["spans"] if span["text"].strip()]
+        size = max(span["size"] for span in spans)
+        bold = all(span["flags"] & 16 for span in spans)
+        short = len(text) < 150
+        if short and y1 < 0.07 * page_height:
+            category = "Page-header"
+        elif short and y0 > 0.93 * page_height:
+            category = "Page-footer"
+        elif not title_seen and size >= 1.5 * body_size and size >= max_size and len(text) < 200:
+            category, title_seen = "Title", True
+        elif short and (size >= 1.15 * body_size or (bold and len(block["lines"]) <= 2)):
+            category = "Section-header"
+        elif CAPTION.match(text):
+            category = "Caption"
+        elif size <= 0.85 * body_size and y0 > 0.75 * page_height:
+            category = "Footnote"
+        elif LIST_MARKER.match(text):
+            category = "List-item"
+        else:
+            category = "Text"
+        cells.append({"bbox": [x0, y0, x1, y1], "category": category, "text": _format_text(category, text)})
+    return cells
+
+
+def _pictures(page, min_side=24):
+    page_rect = page.rect
+    pictures = []
+    for info in page.get_image_info():
+        bbox = page_rect & info["bbox"]
+        if bbox.is_empty or min(bbox.width, bbox.height) < min_side:
+            continue
+        pictures.append({"bbox": [bbox.x0, bbox.y0, bbox.x1, bbox.y1], "category": "Picture"})
+    return pictures
+
+
+def analyze_page(page, min_chars=50, max_image_coverage=0.5, max_garbled_ratio=0.05, max_math_ratio=0.02, max_rulings=8):
+    """Decide whether a pdf page can be read from its embedded text layer.
+
+    A page goes to the model (OCR) when it has too little text, when images cover most of it
+    (scans, including scans with an invisible OCR layer), when its text does not decode to
+    unicode, when it uses math fonts (formulas come out as LaTeX only from the model) or when
+    it has table rulings; rotated pages go to the model as well. Everything else is born-digital text (TXT).
+
+    The text layer of the last two kinds of OCR pages is still `readable`: its words are kept
+    for fill_layout_text, which reads everything but the formulas and tables from it.
+
+    Args:
+        page: pymupdf page.
+        min_chars (int, optional): non-blank characters below which the page counts as scanned.
+        max_image_coverage (float, optional): fraction of the page area images may cover.
+        max_garbled_ratio (float, optional): fraction of unmapped or private-use characters.
+        max_math_ratio (float, optional): fraction of characters in math fonts.
+        max_rulings (int, optional): axis-aligned strokes tolerated before assuming a table.
+
+    Returns:
+        dict: {"method": SupportedPdfParseMethod, "reason": str, "width": float, "height": float,
+            "readable": bool, "words": pymupdf words of readable pages,
+            "cells": layout cells in pdf points, only for TXT pages}
+    """
+    import fitz
+
+    width, height = page.rect.width, page.rect.height
+    layer = {"method": SupportedPdfParseMethod.OCR, "width": width, "height": height, "readable": False, "words": None, "cells": None}
+    if page.rotation:
+        return dict(layer, reason=f"page rotated by {page.rotation} degrees")
+
+    flags = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+    blocks = [b for b in page.get_text("dict", flags=flags)["blocks"] if b.get("type") == 0]
+    spans = [span for block in blocks for line in block["lines"] for span in line["spans"]]
+    chars = sum(_span_chars(span) for span in spans)
+    if chars < min_chars:
+        return dict(layer, reason=f"{chars} characters in the text layer")
+    garbled = sum(
+        1 for span in spans for ch in span["text"] if ch == "\ufffd" or "\ue000" <= ch <= "\uf8ff"
+    )
+    if garbled > max_garbled_ratio * chars:
+        return dict(layer, reason=f"{garbled} of {chars} characters do not map to unicode")
+    coverage = _image_coverage(page)
+    if coverage > max_image_coverage:
+        return dict(layer, reason=f"images cover {coverage:.0%} of the page")
+    layer.update(readable=True, words=page.get_text("words", flags=flags))
+    math_chars = sum(_span_chars(span) for span in spans if MATH_FONT.search(span["font"]))
+    if math_chars > max_math_ratio * chars:
+        return dict(layer, reason=f"{math_chars} characters in math fonts")
+    rulings = _ruling_lines(page, max_rulings)
+    if rulings >= max_rulings:
+        return dict(layer, reason=f"{rulings} ruling lines, likely a table")
+
+    cells = _categorize(blocks, width, height)
+    # pictures go in reading order before the first text block starting below them
+    for picture in _pictures(page):
+        index = next((i for i, cell in enumerate(cells) if cell["bbox"][1] > picture["bbox"][1]), len(cells))
+        cells.insert(index, picture)
+    return dict(layer, method=SupportedPdfParseMethod.TXT, reason=f"{chars} characters of text layer", cells=cells)
+
+
+def text_layer_response(layer, prompt_mode, input_width, input_height):
+    """Writes the cells of a TXT page the way the model answers `prompt_mode`.
+
+    Bboxes are scaled from pdf points to the `input_width` x `input_height` model input, so the
+    response goes through the same post-processing as a model response.
+
+    Returns:
+        str: layout JSON for the layout prompts, markdown text for prompt_ocr
+    """
+    assert prompt_mode in TEXT_LAYER_PROMPT_MODES, f"{prompt_mode} cannot be answered from the text layer"
+    if prompt_mode == "prompt_ocr":
+        # like the model, plain text without page header and footer
+        return "\n\n".join(
+            cell["text"] for cell in layer["cells"]
+            if "text" in cell and cell["category"] not in ("Page-header", "Page-footer")
+        )
+    scale_x = input_width / layer["width"]
+    scale_y = input_height / layer["height"]
+    cells = []
+    for cell in layer["cells"]:
+        x0, y0, x1, y1 = cell["bbox"]
+        out = {
+            "bbox": [round(x0 * scale_x), round(y0 * scale_y), round(x1 * scale_x), round(y1 * scale_y)],
+            "category": cell["category"],
+        }
+        if prompt_mode == "prompt_layout_all_en" and "text" in cell:
+            out["text"] = cell["text"]
+        cells.append(out)
+    return json.dumps(cells, ensure_ascii=False)
+
+
+def fill_layout_text(layer, cells, input_width, input_height, margin=2.0):
+    """Fills in the text of layout-only cells from the words of the text layer inside their bbox.
+
+    A word belongs to a cell when its center lies in the cell's bbox, scaled from the
+    `input_width` x `input_height` model input to pdf points and grown by `margin` points.
+
+    Args:
+        layer (dict): analyze_page result of a readable page.
+        cells (list): layout cells as answered to prompt_layout_only_en, updated in place.
+        input_width (int): width of the model input image.
+        input_height (int): height of the model input image.
+        margin (float, optional): slack around the bboxes in points. Defaults to 2.0.
+
+    Returns:
+        list: indices of the cells whose text has to come from the model, the
+            GROUNDING_CATEGORIES and regions without any text in the text layer
+    """
+    scale_x = layer["width"] / input_width
+    scale_y = layer["height"] / input_height
+    pending = []
+    for index, cell in enumerate(cells):
+        category = cell["category"]
+        if category == "Picture":
+            continue
+        if category in GROUNDING_CATEGORIES:
+            pending.append(index)
+            continue
+        x0, y0, x1, y1 = cell["bbox"]
+        x0, x1 = x0 * scale_x - margin, x1 * scale_x + margin
+        y0, y1 = y0 * scale_y - margin, y1 * scale_y + margin
+        lines = {}
+        for wx0, wy0, wx1, wy1, word, block_no, line_no, _ in layer["words"]:
+            if x0 <= (wx0 + wx1) / 2 <= x1 and y0 <= (wy0 + wy1) / 2 <= y1:
+                lines.setdefault((block_no, line_no), []).append(word)
+        text = _join_lines(" ".join(words) for words in lines.values())
+        if not text:
+            pending.append(index)
+            continue
+        cell["text"] = _format_text(category, text)
+    return pending
@@ -0,0 +1,102 @@
+"""
+Measure per-request client overhead of inference_with_vllm against a local stand-in server.
+
+Compares the old behaviour (a fresh OpenAI client, and so a fresh connection pool, per request)
+with the pooled client handed out by `client_registry`.
+
+    python tools/benchmark_client_pool.py --requests 512 --num_thread 64
+"""
+import json
+import os
+import sys
+import time
+import threading
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing.pool import ThreadPool
+
+from openai import OpenAI
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dots_ocr.model.inference import inference_with_vllm, OpenAIClientRegistry
+
+
+RESPONSE = json.dumps({
+    "id": "bench",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "model",
+    "choices": [{
+        "index": 0,
+        "message": {"role": "assistant", "content": "[]"},
+        "finish_reason": "stop",
+    }],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}).encode("utf-8")
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like vLLM's uvicorn server
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with StandInHandler.lock:
+            StandInHandler.connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(RESPONSE)))
+        self.end_headers()
+        self.wfile.write(RESPONSE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run(label, port, num_requests, num_thread, image, make_client):
+    StandInHandler.connections = 0
+
+    def _one(_):
+        start = time.perf_counter()
+        inference_with_vllm(image, "bench", ip="127.0.0.1", port=port, client=make_client())
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPool(num_thread) as pool:
+        latencies = sorted(pool.map(_one, range(num_requests)))
+    elapsed = time.perf_counter() - start
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(f"{label:>8}: {num_requests / elapsed:8.1f} req/s, p50 {p50:6.2f} ms, p99 {p99:6.2f} ms, "
+          f"{StandInHandler.connections} tcp connections")
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--requests', type=int, default=512)
+    parser.add_argument('--num_thread', type=int, default=64)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    server.daemon_threads = True
+    port = server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    image = Image.new("RGB", (28, 28), (255, 255, 255))
+    registry = OpenAIClientRegistry()
+
+    def fresh_client():
+        return OpenAI(api_key="0", base_url=f"http://127.0.0.1:{port}/v1")
+
+    def pooled_client():
+        return registry.get("127.0.0.1", port, pool_size=args.num_thread)
+
+    run("fresh", port, args.requests, args.num_thread, image, fresh_client)
+    run("pooled", port, args.requests, args.num_thread, image, pooled_client)
+    registry.close()
+    server.shutdown()
@@ -0,0 +1,150 @@
+"""
+Throughput and latency of the hf backend on a CPU-only machine, float32 against int8 dynamic quantization.
+
+The model is a tiny randomly initialised copy of the downloaded DotsOCR architecture (a few
+layers, narrow hidden size), so the numbers show the relative cost of the cpu profile
+settings, not the accuracy or the absolute speed of the real model. Random weights decode
+until the token limit, which keeps the output length fixed across runs.
+
+    python tools/benchmark_hf_cpu.py --config_from ./weights/DotsOCR --pages 8 --threads 1,4,8
+"""
+import os
+import sys
+import json
+import glob
+import time
+import shutil
+import tempfile
+import statistics
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PIL import Image, ImageDraw
+
+from dots_ocr.model.backends import HFBackend
+from dots_ocr.model.hf_registry import hf_model_registry
+from dots_ocr.utils.image_utils import fetch_image
+from dots_ocr.utils.prompts import dict_promptmode_to_prompt
+
+
+# shrunk sizes of the language model and of the vision tower, head_dim stays at 64
+TINY_TEXT = {"hidden_size": 256, "intermediate_size": 512, "num_hidden_layers": 2, "num_attention_heads": 4, "num_key_value_heads": 2}
+TINY_VISION = {"embed_dim": 256, "hidden_size": 256, "intermediate_size": 512, "num_hidden_layers": 2, "num_attention_heads": 4}
+
+
+def build_tiny_model(config_from, out_dir):
+    """
+    Writes a randomly initialised DotsOCR model with TINY_TEXT/TINY_VISION sizes to `out_dir`,
+    reusing the remote code, tokenizer and processor files of the `config_from` directory.
+    """
+    import torch
+    from transformers import AutoConfig, AutoModelForCausalLM
+
+    for path in glob.glob(os.path.join(config_from, "*")):
+        name = os.path.basename(path)
+        if os.path.isfile(path) and not name.endswith(".safetensors") and not name.endswith(".index.json"):
+            shutil.copy(path, out_dir)
+
+    config = AutoConfig.from_pretrained(out_dir, trust_remote_code=True)
+    for key, value in TINY_TEXT.items():
+        if hasattr(config, key):
+            setattr(config, key, value)
+    vision_config = getattr(config, "vision_config", None)
+    if vision_config is not None:
+        for key, value in TINY_VISION.items():
+            if isinstance(vision_config, dict):
+                if key in vision_config:
+                    vision_config[key] = value
+            elif hasattr(vision_config, key):
+                setattr(vision_config, key, value)
+
+    torch.manual_seed(0)
+    model = AutoModelForCausalLM.from_config(config, trust_remote_code=True, torch_dtype=torch.float32)
+    model.save_pretrained(out_dir, safe_serialization=True)
+    num_params = sum(p.numel() for p in model.parameters())
+    print(f"tiny model with {num_params / 1e6:.1f}M parameters written to {out_dir}")
+
+
+def synthetic_page(width=1240, height=1754):
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    for row in range(40):
+        draw.text((80, 80 + row * 40), f"line {row} of a synthetic benchmark page " * 2, fill="black")
+    return image
+
+
+def run(model_path, profile, quantization, num_threads, images, prompt, max_new_tokens, batch_size):
+    backend = HFBackend(
+        model_path=model_path,
+        max_batch_size=batch_size,
+        profile=profile,
+        quantization=quantization,
+        num_threads=num_threads,
+    )
+    backend.warmup()
+    params = {"max_completion_tokens": max_new_tokens}
+    latencies, completion_tokens = [], 0
+    start = time.perf_counter()
+    for i in range(0, len(images), batch_size):
+        chunk = images[i:i + batch_size]
+        stats = [{} for _ in chunk]
+        backend.infer_batch(chunk, [prompt] * len(chunk), params, stats=stats)
+        for s in stats:
+            latencies.append(s["encode_time"] + s["time_to_response"])
+            completion_tokens += s["completion_tokens"]
+    elapsed = time.perf_counter() - start
+    prompt_tokens = stats[0]["prompt_tokens"]
+    backend.close()
+    hf_model_registry.clear()
+    latencies.sort()
+    return {
+        "quantization": quantization,
+        "threads": num_threads,
+        "prompt_tokens": prompt_tokens,
+        "pages_per_second": len(images) / elapsed,
+        "completion_tokens_per_second": completion_tokens / elapsed,
+        "latency_p50": statistics.median(latencies),
+        "latency_p99": latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))],
+    }
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--config_from', type=str, default="./weights/DotsOCR", help="downloaded model dir providing config, code and tokenizer")
+    parser.add_argument('--model_path', type=str, default=None, help="benchmark these weights instead of a tiny random model")
+    parser.add_argument('--pages', type=int, default=8)
+    parser.add_argument('--max_pixels', type=int, default=None, help="defaults to the cpu profile cap")
+    parser.add_argument('--max_new_tokens', type=int, default=32)
+    parser.add_argument('--batch_size', type=int, default=1)
+    parser.add_argument('--threads', type=str, default=str(os.cpu_count()), help="comma separated torch thread counts")
+    parser.add_argument('--prompt_mode', type=str, default="prompt_layout_all_en")
+    args = parser.parse_args()
+
+    from dots_ocr.utils.consts import CPU_MAX_PIXELS
+    max_pixels = args.max_pixels or CPU_MAX_PIXELS
+    page = fetch_image(synthetic_page(), max_pixels=max_pixels)
+    images = [page] * args.pages
+    prompt = dict_promptmode_to_prompt[args.prompt_mode]
+    print(f"{args.pages} page(s) of {page.width}x{page.height} px, {args.max_new_tokens} new tokens each")
+
+    tmp_dir = None
+    model_path = args.model_path
+    if model_path is None:
+        tmp_dir = tempfile.mkdtemp(prefix="dots_ocr_tiny_")
+        build_tiny_model(args.config_from, tmp_dir)
+        model_path = tmp_dir
+    try:
+        results = []
+        for num_threads in [int(t) for t in args.threads.split(',')]:
+            for quantization in ["none", "int8"]:
+                results.append(run(
+                    model_path, "cpu", quantization, num_threads, images, prompt, args.max_new_tokens, args.batch_size,
+                ))
+                print(json.dumps(results[-1]))
+        print(f"{'quant':>6} {'threads':>8} {'pages/s':>9} {'tok/s':>9} {'p50 s':>8} {'p99 s':>8}")
+        for r in results:
+            print(f"{r['quantization']:>6} {r['threads']:>8} {r['pages_per_second']:9.2f} "
+                  f"{r['completion_tokens_per_second']:9.1f} {r['latency_p50']:8.2f} {r['latency_p99']:8.2f}")
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
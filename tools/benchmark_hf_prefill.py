@@ -0,0 +1,117 @@
+"""
+Where the prefill time of an hf page goes, and what the cached chat template saves per page.
+
+dots.ocr puts the page image before the prompt text, so the prompt tokens attend to image
+tokens that differ on every page and their KV cannot be reused as a prefix the way vLLM
+reuses shared leading blocks. This benchmark reports, per page:
+
+    template   rendering the chat template per page against the per-prompt cache of HFBackend
+    full       one forward pass over the whole input (image + prompt)
+    image      one forward pass over the input cut right after the image tokens
+    prompt     full - image, the prefill the constant prompt text adds to every page
+
+    python tools/benchmark_hf_prefill.py --model_path ./weights/DotsOCR --pages 4
+    python tools/benchmark_hf_prefill.py --tiny --config_from ./weights/DotsOCR --profile cpu
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import statistics
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dots_ocr.model.backends import HFBackend
+from dots_ocr.utils.image_utils import fetch_image
+from dots_ocr.utils.prompts import dict_promptmode_to_prompt
+from benchmark_hf_cpu import build_tiny_model, synthetic_page
+
+
+def timed(func, repeat):
+    import torch
+    times = []
+    for _ in range(repeat):
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        func()
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def message_of(image, prompt):
+    return [{"role": "user", "content": [{"type": "image", "image": image}, {"type": "text", "text": prompt}]}]
+
+
+def benchmark(backend, image, prompt, repeat):
+    import torch
+
+    message = message_of(image, prompt)
+    processor = backend.processor
+    template = timed(lambda: processor.apply_chat_template(message, tokenize=False, add_generation_prompt=True), repeat * 10)
+    backend._chat_text(message)
+    cached = timed(lambda: backend._chat_text(message), repeat * 10)
+
+    image_inputs, _ = backend.process_vision_info([message])
+    inputs = processor(text=[backend._chat_text(message)], images=image_inputs, padding=True, return_tensors="pt")
+    inputs = inputs.to(backend.model.device)
+    image_token_id = getattr(backend.model.config, "image_token_id", None)
+    assert image_token_id is not None, "model config has no image_token_id"
+    image_positions = (inputs.input_ids[0] == image_token_id).nonzero()
+    # keep the token closing the image, drop the prompt text and the assistant header
+    cut = int(image_positions[-1]) + 2
+    image_only = dict(inputs)
+    image_only["input_ids"] = inputs.input_ids[:, :cut]
+    image_only["attention_mask"] = inputs.attention_mask[:, :cut]
+
+    with torch.inference_mode():
+        full = timed(lambda: backend.model(**inputs), repeat)
+        image_prefill = timed(lambda: backend.model(**image_only), repeat)
+    return {
+        "total_tokens": int(inputs.input_ids.shape[1]),
+        "image_tokens": len(image_positions),
+        "prompt_tokens": int(inputs.input_ids.shape[1]) - cut,
+        "template_ms": template * 1000,
+        "template_cached_ms": cached * 1000,
+        "full_ms": full * 1000,
+        "image_ms": image_prefill * 1000,
+        "prompt_ms": (full - image_prefill) * 1000,
+    }
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--model_path', type=str, default="./weights/DotsOCR")
+    parser.add_argument('--tiny', action='store_true', help="use a tiny random model built from --config_from")
+    parser.add_argument('--config_from', type=str, default="./weights/DotsOCR")
+    parser.add_argument('--profile', choices=['gpu', 'cpu'], type=str, default='gpu')
+    parser.add_argument('--max_pixels', type=int, nargs='+', default=[802816, 2359296], help="page sizes to measure")
+    parser.add_argument('--prompt_mode', type=str, default="prompt_layout_all_en")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    tmp_dir = None
+    model_path = args.model_path
+    if args.tiny:
+        tmp_dir = tempfile.mkdtemp(prefix="dots_ocr_tiny_")
+        build_tiny_model(args.config_from, tmp_dir)
+        model_path = tmp_dir
+    try:
+        backend = HFBackend(model_path=model_path, max_batch_size=1, profile=args.profile)
+        backend.warmup()
+        prompt = dict_promptmode_to_prompt[args.prompt_mode]
+        print(f"{'max_pixels':>10} {'tokens':>7} {'image':>7} {'prompt':>7} {'template ms':>12} {'cached ms':>10} "
+              f"{'full ms':>9} {'image ms':>9} {'prompt ms':>10} {'prompt %':>9}")
+        for max_pixels in args.max_pixels:
+            image = fetch_image(synthetic_page(), max_pixels=max_pixels)
+            r = benchmark(backend, image, prompt, args.repeat)
+            print(f"{max_pixels:>10} {r['total_tokens']:>7} {r['image_tokens']:>7} {r['prompt_tokens']:>7} "
+                  f"{r['template_ms']:12.3f} {r['template_cached_ms']:10.4f} {r['full_ms']:9.1f} {r['image_ms']:9.1f} "
+                  f"{r['prompt_ms']:10.1f} {100 * r['prompt_ms'] / r['full_ms']:9.1f}")
+        backend.close()
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
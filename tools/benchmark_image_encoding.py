@@ -0,0 +1,51 @@
+"""
+Report payload bytes per page and encode milliseconds per page for each image encoding policy.
+
+    python tools/benchmark_image_encoding.py demo/demo_pdf1.pdf --dpi 200
+"""
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dots_ocr.utils.doc_utils import load_images_from_pdf
+from dots_ocr.utils.image_utils import fetch_image, ImageEncodePolicy
+
+
+POLICIES = {
+    "png (default)": ImageEncodePolicy(),
+    "png level 1": ImageEncodePolicy(compress_level=1),
+    "png reduce": ImageEncodePolicy(reduce_colors=True),
+    "png reduce level 1": ImageEncodePolicy(compress_level=1, reduce_colors=True),
+    "jpeg q95": ImageEncodePolicy(format='JPEG', quality=95),
+    "jpeg q85": ImageEncodePolicy(format='JPEG', quality=85),
+    "webp q90": ImageEncodePolicy(format='WEBP', quality=90),
+}
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('input_path', type=str, help="pdf or image file")
+    parser.add_argument('--dpi', type=int, default=200)
+    parser.add_argument('--max_pixels', type=int, default=None)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.input_path.endswith('.pdf'):
+        images = load_images_from_pdf(args.input_path, dpi=args.dpi)
+    else:
+        images = [fetch_image(args.input_path)]
+    images = [fetch_image(image, max_pixels=args.max_pixels) for image in images]
+    print(f"{len(images)} page(s), {images[0].width}x{images[0].height} px first page")
+
+    print(f"{'policy':>20} {'KB/page':>10} {'encode ms/page':>15}")
+    for name, policy in POLICIES.items():
+        total_bytes = 0
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for image in images:
+                total_bytes += len(policy.encode(image))
+        elapsed = time.perf_counter() - start
+        num_pages = args.repeat * len(images)
+        print(f"{name:>20} {total_bytes / num_pages / 1024:10.1f} {elapsed / num_pages * 1000:15.1f}")
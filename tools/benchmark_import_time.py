@@ -0,0 +1,71 @@
+"""
+Measure the cost of importing dots_ocr with `python -X importtime` and fail when it regresses.
+
+Exits non-zero if the median cumulative import time of the module is over `--budget_ms`, or
+if one of the heavy dependencies that should load on first use is imported eagerly.
+
+    python tools/benchmark_import_time.py --module dots_ocr.parser --budget_ms 300
+"""
+import os
+import re
+import sys
+import subprocess
+import statistics
+from argparse import ArgumentParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# only needed once a request is sent, a pdf is opened or a progress bar is drawn
+LAZY_MODULES = ["openai", "httpx", "requests", "fitz", "tqdm", "pydantic", "numpy", "torch", "transformers"]
+
+LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def import_times(module):
+    """
+    Imports `module` in a fresh interpreter.
+
+    Returns:
+        dict: top level module name -> (self us, cumulative us) for everything it imported.
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env, cwd=ROOT,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{proc.stderr}")
+    times = {}
+    for line in proc.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            times[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+    return times
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--module', type=str, default='dots_ocr.parser')
+    parser.add_argument('--budget_ms', type=float, default=300, help="fail above this median cumulative import time")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help="number of slowest modules to list")
+    args = parser.parse_args()
+
+    runs = [import_times(args.module) for _ in range(args.repeat)]
+    total_ms = statistics.median(run[args.module][1] for run in runs) / 1000
+    last = runs[-1]
+
+    print(f"import {args.module}: {total_ms:.1f} ms (median of {args.repeat}, budget {args.budget_ms:.0f} ms)")
+    print(f"{'self ms':>10} {'cumulative ms':>15}  module")
+    for name, (self_us, cumulative_us) in sorted(last.items(), key=lambda item: -item[1][0])[:args.top]:
+        print(f"{self_us / 1000:10.1f} {cumulative_us / 1000:15.1f}  {name}")
+
+    failures = []
+    if total_ms > args.budget_ms:
+        failures.append(f"import time {total_ms:.1f} ms is over the budget of {args.budget_ms:.0f} ms")
+    eager = [name for name in LAZY_MODULES if name in last]
+    if eager:
+        failures.append(f"imported eagerly: {', '.join(eager)}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,105 @@
+"""
+End-to-end client throughput of DotsOCRParser.parse_file against the mock vLLM server.
+
+The mock server runs in a subprocess so that the CPU time measured here is the client's
+own: rendering, resizing, encoding, HTTP and post-processing. Without --input a synthetic
+PDF with --pages text pages is generated.
+
+    python tools/benchmark_parser_throughput.py --pages 64 --num_thread 16
+    python tools/benchmark_parser_throughput.py --input demo/demo_pdf1.pdf --decode_ms_per_token 2
+"""
+import os
+import sys
+import time
+import json
+import tempfile
+import subprocess
+import urllib.request
+from argparse import ArgumentParser
+
+import fitz
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from dots_ocr.parser import DotsOCRParser
+
+
+def make_pdf(path, num_pages):
+    doc = fitz.open()
+    for i in range(num_pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Benchmark page {i + 1}", fontsize=20)
+        for line in range(40):
+            page.insert_text((72, 110 + line * 16), f"line {line}: the quick brown fox jumps over the lazy dog", fontsize=10)
+    doc.save(path)
+    doc.close()
+
+
+def start_server(port, args):
+    command = [
+        sys.executable, "-m", "dots_ocr.tools.mock_server",
+        "--port", str(port),
+        "--base_latency", str(args.base_latency),
+        "--prefill_ms_per_token", str(args.prefill_ms_per_token),
+        "--decode_ms_per_token", str(args.decode_ms_per_token),
+    ]
+    if args.max_num_seqs:
+        command += ["--max_num_seqs", str(args.max_num_seqs)]
+    process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/v1/models", timeout=1)
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("mock server did not start")
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--input', type=str, default=None, help="pdf or image, defaults to a synthetic pdf")
+    parser.add_argument('--pages', type=int, default=32, help="pages of the synthetic pdf")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--num_thread', type=int, default=16)
+    parser.add_argument('--dpi', type=int, default=200)
+    parser.add_argument('--prompt_mode', type=str, default="prompt_layout_all_en")
+    parser.add_argument('--base_latency', type=float, default=0.02)
+    parser.add_argument('--prefill_ms_per_token', type=float, default=0.05)
+    parser.add_argument('--decode_ms_per_token', type=float, default=1.0)
+    parser.add_argument('--max_num_seqs', type=int, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = args.input
+        if input_path is None:
+            input_path = os.path.join(tmp_dir, "benchmark.pdf")
+            make_pdf(input_path, args.pages)
+
+        server = start_server(args.port, args)
+        try:
+            dots_ocr_parser = DotsOCRParser(
+                port=args.port, num_thread=args.num_thread, dpi=args.dpi, output_dir=os.path.join(tmp_dir, "output"),
+            )
+            cpu_start, wall_start = time.process_time(), time.perf_counter()
+            results = dots_ocr_parser.parse_file(input_path, prompt_mode=args.prompt_mode)
+            cpu, wall = time.process_time() - cpu_start, time.perf_counter() - wall_start
+        finally:
+            server.terminate()
+            server.wait()
+
+    latencies = [result['time_to_response'] for result in results if result.get('time_to_response') is not None]
+    report = {
+        'pages': len(results),
+        'pages_per_second': round(len(results) / wall, 2),
+        'p50_latency_ms': round(percentile(latencies, 0.5) * 1000, 1) if latencies else None,
+        'p99_latency_ms': round(percentile(latencies, 0.99) * 1000, 1) if latencies else None,
+        'client_cpu_ms_per_page': round(cpu / max(1, len(results)) * 1000, 1),
+    }
+    print(json.dumps(report))
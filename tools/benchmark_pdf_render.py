@@ -0,0 +1,71 @@
+"""
+Pages per second of pdf rasterisation in the calling process against a pool of render worker processes.
+
+Without an input pdf a vector-heavy one is generated (hundreds of bezier strokes and text runs
+per page), the case where rendering can take longer than inference. Times include starting the
+worker processes, which a DotsOCRParser pays once for its lifetime.
+
+    python tools/benchmark_pdf_render.py --pages 8,32,128 --workers 0,2,4,8
+    python tools/benchmark_pdf_render.py --input_path demo/demo_pdf1.pdf --workers 0,4
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dots_ocr.utils.doc_utils import load_images_from_pdf
+
+
+def make_vector_pdf(path, num_pages, strokes_per_page=500):
+    import fitz
+    rng = random.Random(0)
+    doc = fitz.open()
+    for page_no in range(num_pages):
+        page = doc.new_page(width=595, height=842)
+        shape = page.new_shape()
+        for _ in range(strokes_per_page):
+            p1 = fitz.Point(rng.uniform(0, 595), rng.uniform(0, 842))
+            p2 = fitz.Point(rng.uniform(0, 595), rng.uniform(0, 842))
+            shape.draw_bezier(p1, fitz.Point(rng.uniform(0, 595), rng.uniform(0, 842)), fitz.Point(rng.uniform(0, 595), rng.uniform(0, 842)), p2)
+        shape.finish(width=0.3, color=(0, 0, 0))
+        shape.commit()
+        for row in range(60):
+            page.insert_text((40, 40 + row * 13), f"page {page_no} row {row} " * 6, fontsize=8)
+    doc.save(path)
+    doc.close()
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument('--input_path', type=str, default=None, help="pdf to render, by default a generated vector-heavy one")
+    parser.add_argument('--pages', type=str, default="8,32,128", help="comma separated page counts")
+    parser.add_argument('--workers', type=str, default="0,2,4,8", help="comma separated render worker counts, 0 renders in process")
+    parser.add_argument('--dpi', type=int, default=200)
+    parser.add_argument('--strokes', type=int, default=500, help="bezier strokes per generated page")
+    args = parser.parse_args()
+
+    page_counts = [int(p) for p in args.pages.split(',')]
+    worker_counts = [int(w) for w in args.workers.split(',')]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = args.input_path
+        if input_path is None:
+            input_path = os.path.join(tmp_dir, "vector.pdf")
+            make_vector_pdf(input_path, max(page_counts), strokes_per_page=args.strokes)
+        import fitz
+        with fitz.open(input_path) as doc:
+            page_counts = [min(p, doc.page_count) for p in page_counts]
+
+        print(f"{'pages':>6} {'workers':>8} {'seconds':>9} {'pages/s':>9} {'speedup':>8}")
+        for num_pages in page_counts:
+            baseline = None
+            for num_workers in worker_counts:
+                start = time.perf_counter()
+                images = load_images_from_pdf(input_path, dpi=args.dpi, end_page_id=num_pages - 1, num_workers=num_workers)
+                elapsed = time.perf_counter() - start
+                assert len(images) == num_pages
+                baseline = baseline or elapsed
+                print(f"{num_pages:>6} {num_workers:>8} {elapsed:9.2f} {num_pages / elapsed:9.1f} {baseline / elapsed:8.2f}x")
+                del images